@@ -0,0 +1,55 @@
+"""
+batched test functions to be minimized, every function maps an (n, d) matrix to an (n,) vector
+"""
+import numpy as np
+
+
+def sphere(x):
+    return np.sum(np.square(x), axis=1)
+
+
+def rastrigin(x):
+    return 10 * x.shape[1] + np.sum(np.square(x) - 10 * np.cos(2 * np.pi * x), axis=1)
+
+
+def rosenbrock(x):
+    return np.sum(100 * np.square(x[:, 1:] - np.square(x[:, :-1])) + np.square(1 - x[:, :-1]), axis=1)
+
+
+def ackley(x):
+    return -20 * np.exp(-.2 * np.sqrt(np.mean(np.square(x), axis=1))) \
+        - np.exp(np.mean(np.cos(2 * np.pi * x), axis=1)) + 20 + np.e
+
+
+# name: (function, search domain bound, fitness target)
+FUNCTIONS = {
+    "sphere": (sphere, 5.12, 1e-6),
+    "rastrigin": (rastrigin, 5.12, 1.),
+    "rosenbrock": (rosenbrock, 2.048, 1e-2),
+    "ackley": (ackley, 32.768, 1e-3),
+}
+
+
+class Recorder:
+    def __init__(self, function, target, maximize=False):
+        """
+        batched objective counting evaluations and the evaluations needed to reach the target
+        :param function: batched test function to be minimized
+        :param target: fitness target
+        :param maximize: return the negated value to optimizers that maximize
+        """
+        self.function = function
+        self.target = target
+        self.maximize = maximize
+        self.evaluations = 0
+        self.evaluations_to_target = None
+        self.best = np.inf
+
+    def __call__(self, population):
+        population = np.atleast_2d(population)
+        fitness = self.function(population)
+        if self.evaluations_to_target is None and (fitness <= self.target).any():
+            self.evaluations_to_target = self.evaluations + int(np.argmax(fitness <= self.target)) + 1
+        self.evaluations += len(population)
+        self.best = min(self.best, float(fitness.min()))
+        return -fitness if self.maximize else fitness
@@ -0,0 +1,75 @@
+"""
+import time of the matcha modules, every import is timed in a fresh interpreter.
+
+    python benchmarks/import_time.py --repeat 10
+    python benchmarks/import_time.py --modules matcha.heuristic matcha.heuristic.es --max-time .5
+
+the median and the minimum over --repeat interpreters are reported in seconds, numpy is imported before
+the timer starts, so the numbers are the cost of matcha itself. exits with 1 if a module fails to import
+or its median is above --max-time.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    "matcha.core",
+    "matcha.heuristic",
+    "matcha.heuristic.pso",
+    "matcha.heuristic.es",
+    "matcha.heuristic.sa",
+    "matcha.heuristic.afs",
+    "matcha.heuristic.aco",
+    "matcha.core.experiment",
+    "matcha.core.island",
+]
+
+SCRIPT = "import time, numpy; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+
+def time_import(module, repeat):
+    """
+    :return: import times in seconds, None if the import failed
+    """
+    times = []
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-c", SCRIPT.format(module=module)], capture_output=True, text=True, env=env)
+        if result.returncode != 0:
+            print(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else result.returncode)
+            return None
+        times.append(float(result.stdout))
+    return times
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-time", type=float, default=None, help="largest median import time in seconds")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    failed = False
+    for module in args.modules:
+        times = time_import(module, args.repeat)
+        if times is None:
+            print(f"{module:>24} failed")
+            failed = True
+            continue
+        median = statistics.median(times)
+        print(f"{module:>24} median {median * 1e3:8.2f}ms min {min(times) * 1e3:8.2f}ms")
+        if args.max_time is not None and median > args.max_time:
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
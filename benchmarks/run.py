@@ -0,0 +1,285 @@
+"""
+benchmark every heuristic on standard test functions and travelling salesman instances.
+
+    python benchmarks/run.py --dims 2 10 30 --seeds 0 1 2 --output benchmark.jsonl
+    python benchmarks/run.py --output new.jsonl --compare benchmark.jsonl
+
+every run is written as one json line with wall time, evaluations, evaluations per second,
+evaluations to target and peak memory. --compare reports runs whose throughput dropped by
+more than --tolerance against a previous output, and exits with 1 if there is any.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matcha.heuristic.aco import AntColonyOptimization  # noqa: E402
+from matcha.heuristic.afs import ArtificialFishSwarm  # noqa: E402
+from matcha.heuristic.es import (  # noqa: E402
+    EvolutionStrategy,
+    GaussianProcessEvolutionStrategy,
+    CovarianceMatrixAdaptionEvolutionStrategy,
+    SeparableCovarianceMatrixAdaptionEvolutionStrategy,
+)
+from matcha.heuristic.pso import ParticularSwarmOptimization  # noqa: E402
+from matcha.heuristic.sa import SimulatedAnnealing, MultiChainSimulatedAnnealing  # noqa: E402
+from matcha.core.rng import make_rng  # noqa: E402
+
+from functions import FUNCTIONS, Recorder  # noqa: E402
+from tsp import uniform_instance, load_tsplib  # noqa: E402
+
+
+def _uniform(rng, bound, *shape):
+    return lambda: rng.uniform(-bound, bound, size=shape)
+
+
+def build_pso(dim, bound, function, target, budget, rng):
+    recorder = Recorder(function, target, maximize=True)
+    group_size = 40
+    optimizer = ParticularSwarmOptimization(group_size, .7, 1.5, 1.5, max(1, budget // group_size), seed=rng)
+    optimizer.setup(
+        fitness_calculation=recorder,
+        position_initialization=_uniform(rng, bound, 1, dim),
+        velocity_initialization=_uniform(rng, bound * .1, 1, dim),
+        position_validation=lambda x: np.clip(x, -bound, bound),
+        batch=True
+    )
+    return optimizer, recorder
+
+
+def build_es(dim, bound, function, target, budget, rng):
+    recorder = Recorder(function, target)
+    group_size = 20
+    optimizer = EvolutionStrategy(group_size, bound * .01, max(1, budget // (2 * group_size + 1)), 1e-3, seed=rng)
+    optimizer.setup(fitness_calculation=recorder, initialization=_uniform(rng, bound, 1, dim), batch=True)
+    return optimizer, recorder
+
+
+def build_gpes(dim, bound, function, target, budget, rng):
+    recorder = Recorder(function, target)
+    mu = 50
+    optimizer = GaussianProcessEvolutionStrategy(mu, 10, max(1, budget // mu), seed=rng)
+    optimizer.setup(
+        fitness_calculation=recorder,
+        mean_initialization=_uniform(rng, bound, dim),
+        variance_initialization=lambda: np.full(dim, (bound / 2) ** 2),
+        batch=True
+    )
+    return optimizer, recorder
+
+
+def _build_cmaes(optimizer_type):
+    def build(dim, bound, function, target, budget, rng):
+        recorder = Recorder(function, target)
+        population_size = 4 + int(3 * np.log(dim))
+        optimizer = optimizer_type(bound * .3, max(1, budget // population_size), seed=rng)
+        optimizer.setup(fitness_calculation=recorder, mean_initialization=_uniform(rng, bound, dim), batch=True)
+        return optimizer, recorder
+    return build
+
+
+def build_sa(dim, bound, function, target, budget, rng):
+    recorder = Recorder(function, target, maximize=True)
+    optimizer = SimulatedAnnealing(1., max(1, budget - 1), seed=rng)
+    optimizer.setup(fitness_calculation=recorder, initialization=_uniform(rng, bound, dim), batch=True)
+    return optimizer, recorder
+
+
+def build_multi_chain_sa(dim, bound, function, target, budget, rng):
+    recorder = Recorder(function, target, maximize=True)
+    n_chain = 16
+    optimizer = MultiChainSimulatedAnnealing(1., max(1, budget // n_chain - 1), n_chain, seed=rng)
+    optimizer.setup(fitness_calculation=recorder, initialization=_uniform(rng, bound, dim), batch=True)
+    return optimizer, recorder
+
+
+def build_afs(dim, bound, function, target, budget, rng):
+    recorder = Recorder(function, target, maximize=True)
+    swarm_size = 50
+    # a fish scores up to three candidates per generation
+    optimizer = ArtificialFishSwarm(
+        bound * .2, 3, swarm_size, max(1, budget // (2 * swarm_size)), vectorized=True, seed=rng)
+    optimizer.setup(
+        fitness_calculation=recorder,
+        position_initialization=_uniform(rng, bound, dim),
+        direction_initialization=lambda: rng.standard_normal(size=dim),
+        speed_initialization=lambda: bound * .05,
+        batch=True
+    )
+    return optimizer, recorder
+
+
+ALGORITHMS = {
+    "pso": build_pso,
+    "es": build_es,
+    "gpes": build_gpes,
+    "cmaes": _build_cmaes(CovarianceMatrixAdaptionEvolutionStrategy),
+    "sepcmaes": _build_cmaes(SeparableCovarianceMatrixAdaptionEvolutionStrategy),
+    "sa": build_sa,
+    "mcsa": build_multi_chain_sa,
+    "afs": build_afs,
+}
+
+# name: init params of AntColonyOptimization besides graph
+ACO_CONFIGS = {
+    "aco": dict(group_size=20, max_iter=20),
+    "aco-vectorized": dict(group_size=20, max_iter=20, vectorized=True),
+    "aco-candidates": dict(group_size=20, max_iter=20, vectorized=True, n_candidate=10),
+    "aco-low-memory": dict(
+        group_size=20, max_iter=20, vectorized=True, n_candidate=10, low_memory=True, lazy_decay=True),
+}
+
+
+def measure(run, memory):
+    """
+    :param run: callable doing the benchmarked work
+    :param memory: also measure the traced peak memory, in a second run to keep it out of the wall time
+    :return: wall time and peak memory in bytes
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        run()
+        wall_time = time.perf_counter() - start
+        peak_memory = None
+        if memory:
+            tracemalloc.start()
+            run()
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+    return wall_time, peak_memory
+
+
+def bench_function(algorithm, problem, dim, seed, budget, memory):
+    function, bound, target = FUNCTIONS[problem]
+    state = {}
+
+    def run():
+        rng = make_rng(seed)
+        state["optimizer"], state["recorder"] = ALGORITHMS[algorithm](dim, bound, function, target, budget, rng)
+        state["optimizer"].optimize()
+
+    wall_time, peak_memory = measure(run, memory)
+    recorder = state["recorder"]
+    return {
+        "algorithm": algorithm,
+        "problem": problem,
+        "dim": dim,
+        "seed": seed,
+        "budget": budget,
+        "wall_time": wall_time,
+        "evaluations": recorder.evaluations,
+        "evaluations_per_second": recorder.evaluations / wall_time,
+        "target": target,
+        "evaluations_to_target": recorder.evaluations_to_target,
+        "best_fitness": recorder.best,
+        "peak_memory": peak_memory,
+    }
+
+
+def bench_tsp(config, problem, graph, seed, memory):
+    params = ACO_CONFIGS[config]
+    state = {}
+
+    def run():
+        state["optimizer"] = AntColonyOptimization(graph, seed=seed, **params).optimize()
+
+    wall_time, peak_memory = measure(run, memory)
+    tours = params["group_size"] * params["max_iter"]
+    return {
+        "algorithm": config,
+        "problem": problem,
+        "dim": graph.shape[0],
+        "seed": seed,
+        "wall_time": wall_time,
+        "evaluations": tours,
+        "evaluations_per_second": tours / wall_time,
+        "best_fitness": float(state["optimizer"].best_distance),
+        "peak_memory": peak_memory,
+    }
+
+
+def compare(records, baseline_path, tolerance):
+    """
+    :return: runs of records whose evaluations per second dropped by more than tolerance against the baseline
+    """
+    key = lambda record: (record["algorithm"], record["problem"], record["dim"], record["seed"])
+    with open(baseline_path) as f:
+        baseline = {key(record): record for record in map(json.loads, f) if "algorithm" in record}
+    regressions = []
+    for record in records:
+        previous = baseline.get(key(record))
+        if previous is None:
+            continue
+        ratio = record["evaluations_per_second"] / previous["evaluations_per_second"]
+        if ratio < 1 - tolerance:
+            regressions.append((key(record), ratio))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--algorithms", nargs="+", default=list(ALGORITHMS) + list(ACO_CONFIGS))
+    parser.add_argument("--functions", nargs="+", default=list(FUNCTIONS))
+    parser.add_argument("--dims", nargs="+", type=int, default=[2, 10, 30])
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0])
+    parser.add_argument("--budget", type=int, default=10000, help="evaluations per run")
+    parser.add_argument("--tsp-sizes", nargs="+", type=int, default=[50, 200])
+    parser.add_argument("--tsplib", nargs="*", default=[], help="TSPLIB files with node coordinates")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory run")
+    parser.add_argument("--output", default="benchmark.jsonl")
+    parser.add_argument("--compare", default=None, help="previous output to check throughput against")
+    parser.add_argument("--tolerance", type=float, default=.2)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    memory = not args.no_memory
+
+    tsp_instances = [(f"uniform{n}", uniform_instance(n)) for n in args.tsp_sizes]
+    tsp_instances += [(os.path.splitext(os.path.basename(path))[0], load_tsplib(path)) for path in args.tsplib]
+
+    records = []
+    with open(args.output, "w") as f:
+        f.write(json.dumps({
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }) + "\n")
+        for algorithm in args.algorithms:
+            for seed in args.seeds:
+                if algorithm in ACO_CONFIGS:
+                    runs = [lambda p=problem, g=graph: bench_tsp(algorithm, p, g, seed, memory)
+                            for problem, graph in tsp_instances]
+                else:
+                    runs = [lambda p=problem, d=dim: bench_function(algorithm, p, d, seed, args.budget, memory)
+                            for problem in args.functions for dim in args.dims]
+                for run in runs:
+                    record = run()
+                    records.append(record)
+                    f.write(json.dumps(record) + "\n")
+                    f.flush()
+                    print(f"{record['algorithm']:>16} {record['problem']:>12} {record['dim']:>5} "
+                          f"{record['wall_time']:8.3f}s {record['evaluations_per_second']:12.1f}/s "
+                          f"best {record['best_fitness']:.4g}")
+
+    if args.compare:
+        regressions = compare(records, args.compare, args.tolerance)
+        for run_key, ratio in regressions:
+            print(f"regression {run_key}: {ratio:.2f}x throughput")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
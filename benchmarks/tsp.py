@@ -0,0 +1,42 @@
+"""
+travelling salesman instances for AntColonyOptimization
+"""
+import numpy as np
+
+
+def distance_matrix(coordinates):
+    difference = coordinates[:, np.newaxis, :] - coordinates[np.newaxis, ...]
+    return np.sqrt(np.square(difference).sum(axis=-1))
+
+
+def uniform_instance(n_city, seed=0):
+    """
+    cities drawn uniformly from the unit square
+    :param n_city:
+    :param seed:
+    :return: (n_city, n_city) distance matrix
+    """
+    return distance_matrix(np.random.RandomState(seed).random_sample((n_city, 2)))
+
+
+def load_tsplib(path):
+    """
+    read the NODE_COORD_SECTION of a TSPLIB file with EUC_2D or ATT coordinates
+    :param path:
+    :return: (n, n) distance matrix
+    """
+    coordinates = []
+    with open(path) as f:
+        in_section = False
+        for line in f:
+            line = line.strip()
+            if line.startswith("NODE_COORD_SECTION"):
+                in_section = True
+            elif line == "EOF" or not line:
+                in_section = False
+            elif in_section:
+                _, x, y = line.split()[:3]
+                coordinates.append((float(x), float(y)))
+    if not coordinates:
+        raise ValueError(f"{path} has no NODE_COORD_SECTION.")
+    return distance_matrix(np.array(coordinates))
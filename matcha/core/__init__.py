@@ -1,9 +1,11 @@
-from typing import Optional, Callable, Dict
+import importlib
+from typing import Optional, Callable, Dict, List
 
 
 class Factory:
 
     _registry = None
+    _lazy_registry = None
 
     @classmethod
     def register(cls, name: str) -> Callable:
@@ -18,8 +20,28 @@ class Factory:
             return wrapped_class
         return inner_func
 
+    @classmethod
+    def register_lazy(cls, name: str, module: str) -> None:
+        """
+        declare a name registered by module, which is only imported when the name is first created
+        :param name:
+        :param module: dotted module path
+        """
+        if cls._lazy_registry is None:
+            cls._lazy_registry = {}
+        cls._lazy_registry[name] = module
+
+    @classmethod
+    def names(cls) -> List[str]:
+        """
+        :return: registered and lazily declared names, without importing anything
+        """
+        return sorted(set(cls._registry or {}) | set(cls._lazy_registry or {}))
+
     @classmethod
     def create_type(cls, name: str) -> type:
+        if (cls._registry is None or name not in cls._registry) and name in (cls._lazy_registry or {}):
+            importlib.import_module(cls._lazy_registry[name])
         if cls._registry is None or name not in cls._registry:
             raise KeyError(f"{name} is not registered.")
         return cls._registry[name]
@@ -0,0 +1,53 @@
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
+import numpy as np
+
+
+class FitnessCache:
+    def __init__(self, max_size=65536):
+        """
+        least recently used fitness store keyed on a hash of the position bytes
+        :param max_size: number of positions kept, the least recently used one is evicted beyond it
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._store = OrderedDict()
+        self._lock = Lock()
+
+    @staticmethod
+    def key(position):
+        position = np.ascontiguousarray(position)
+        return hashlib.blake2b(position.tobytes(), digest_size=16).digest()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._store:
+                self._store.move_to_end(key)
+                self.hits += 1
+                return self._store[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, fitness):
+        with self._lock:
+            self._store[key] = fitness
+            self._store.move_to_end(key)
+            while len(self._store) > self.max_size:
+                self._store.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._store.clear()
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.
+
+    def __len__(self):
+        return len(self._store)
@@ -0,0 +1,193 @@
+import time
+
+import numpy as np
+
+
+class Callback:
+    """
+    per generation hooks of optimize, every hook does nothing by default.
+    a generation is one ask/tell round: generation begin, evaluation begin, evaluation end, generation end.
+    """
+
+    def on_optimize_begin(self, optimizer):
+        pass
+
+    def on_generation_begin(self, optimizer):
+        pass
+
+    def on_evaluation_begin(self, optimizer):
+        pass
+
+    def on_evaluation_end(self, optimizer, population, fitness):
+        pass
+
+    def on_generation_end(self, optimizer):
+        pass
+
+    def on_optimize_end(self, optimizer):
+        pass
+
+
+class CallbackList(Callback):
+    def __init__(self, callbacks=None):
+        self.callbacks = list(callbacks) if callbacks is not None else []
+
+    def on_optimize_begin(self, optimizer):
+        for callback in self.callbacks:
+            callback.on_optimize_begin(optimizer)
+
+    def on_generation_begin(self, optimizer):
+        for callback in self.callbacks:
+            callback.on_generation_begin(optimizer)
+
+    def on_evaluation_begin(self, optimizer):
+        for callback in self.callbacks:
+            callback.on_evaluation_begin(optimizer)
+
+    def on_evaluation_end(self, optimizer, population, fitness):
+        for callback in self.callbacks:
+            callback.on_evaluation_end(optimizer, population, fitness)
+
+    def on_generation_end(self, optimizer):
+        for callback in self.callbacks:
+            callback.on_generation_end(optimizer)
+
+    def on_optimize_end(self, optimizer):
+        for callback in self.callbacks:
+            callback.on_optimize_end(optimizer)
+
+
+class FitnessHistory(Callback):
+    """
+    best fitness of every generation and the best fitness so far, following optimizer.maximize
+    """
+
+    def __init__(self):
+        self.generation_best = []
+        self.best = []
+        self._generation_fitness = []
+
+    def _better(self, optimizer, a, b):
+        return a > b if optimizer.maximize else a < b
+
+    def on_optimize_begin(self, optimizer):
+        self.generation_best = []
+        self.best = []
+
+    def on_generation_begin(self, optimizer):
+        self._generation_fitness = []
+
+    def on_evaluation_end(self, optimizer, population, fitness):
+        if len(fitness):
+            self._generation_fitness.append(np.max(fitness) if optimizer.maximize else np.min(fitness))
+
+    def on_generation_end(self, optimizer):
+        if not self._generation_fitness:
+            return
+        generation_best = max(self._generation_fitness) if optimizer.maximize else min(self._generation_fitness)
+        self.generation_best.append(generation_best)
+        if not self.best or self._better(optimizer, generation_best, self.best[-1]):
+            self.best.append(generation_best)
+        else:
+            self.best.append(self.best[-1])
+
+
+class ProgressPrinter(FitnessHistory):
+    def __init__(self, interval=10):
+        """
+        prints the generation and the best fitness so far every interval generations
+        :param interval:
+        """
+        super().__init__()
+        self.interval = interval
+        self._n_generation = 0
+
+    def on_optimize_begin(self, optimizer):
+        super().on_optimize_begin(optimizer)
+        self._n_generation = 0
+
+    def on_generation_end(self, optimizer):
+        super().on_generation_end(optimizer)
+        if self._n_generation % self.interval == 0 and self.best:
+            print(self._n_generation, self.best[-1])
+        self._n_generation += 1
+
+
+def count_evaluations(optimizer, fitness):
+    """
+    :param optimizer: optimizer of an evaluation_end event
+    :param fitness: fitness of that event
+    :return: number of calls of the objective, candidates screened out by a SurrogateEvaluator, infeasible
+        under a ConstrainedEvaluator or found in the cache of a CachedEvaluator are not passed to it
+    """
+    return len(fitness) - getattr(getattr(optimizer, "evaluator", None), "n_skipped", 0)
+
+
+class EvaluationCounter(Callback):
+    def __init__(self):
+        self.n_evaluation = 0
+        self.n_generation = 0
+
+    def on_optimize_begin(self, optimizer):
+        self.n_evaluation = 0
+        self.n_generation = 0
+
+    def on_evaluation_end(self, optimizer, population, fitness):
+        self.n_evaluation += count_evaluations(optimizer, fitness)
+
+    def on_generation_end(self, optimizer):
+        self.n_generation += 1
+
+
+class DiversityRecorder(Callback):
+    """
+    mean standard deviation over the dimensions of every evaluated population.
+    integer populations such as ant paths are skipped.
+    """
+
+    def __init__(self):
+        self.diversity = []
+
+    def on_optimize_begin(self, optimizer):
+        self.diversity = []
+
+    def on_evaluation_end(self, optimizer, population, fitness):
+        population = np.asarray(population)
+        if len(population) > 1 and np.issubdtype(population.dtype, np.floating):
+            self.diversity.append(float(population.reshape(len(population), -1).std(axis=0).mean()))
+
+
+class PhaseTimer(Callback):
+    """
+    wall time spent in evaluation, update (ask and tell) and bookkeeping (other callbacks and the loop)
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.timings = {"evaluation": 0., "update": 0., "bookkeeping": 0.}
+        self._last = None
+
+    def _lap(self, phase):
+        now = self.clock()
+        if self._last is not None:
+            self.timings[phase] += now - self._last
+        self._last = now
+
+    def on_optimize_begin(self, optimizer):
+        self.timings = {"evaluation": 0., "update": 0., "bookkeeping": 0.}
+        self._last = self.clock()
+
+    def on_generation_begin(self, optimizer):
+        self._lap("bookkeeping")
+
+    def on_evaluation_begin(self, optimizer):
+        self._lap("update")
+
+    def on_evaluation_end(self, optimizer, population, fitness):
+        self._lap("evaluation")
+
+    def on_generation_end(self, optimizer):
+        self._lap("update")
+
+    def on_optimize_end(self, optimizer):
+        self._lap("bookkeeping")
@@ -0,0 +1,166 @@
+import json
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+from matcha.core.callback import Callback
+
+
+def get_rng_state(rng=None):
+    """
+    :param rng: numpy Generator of an optimizer
+    :return: json bytes of the generator state and the global numpy state, which setup callables may draw from
+    """
+    state = {"numpy": np.random.get_state(legacy=False)}
+    if rng is not None:
+        state["generator"] = rng.bit_generator.state
+    return json.dumps(state, default=_to_json).encode()
+
+
+def set_rng_state(state, rng=None, restore_global=False):
+    """
+    :param state: bytes from get_rng_state
+    :param rng: numpy Generator restored in place, so every holder of it sees the restored stream
+    :param restore_global: also restore the global numpy state, which reseeds every user of np.random
+        in the process, for setup callables drawing from it
+    :return:
+    """
+    state = json.loads(state)
+    if restore_global:
+        numpy_state = state["numpy"]
+        numpy_state["state"]["key"] = np.array(numpy_state["state"]["key"], dtype=np.uint32)
+        np.random.set_state(numpy_state)
+    if rng is not None and "generator" in state:
+        rng.bit_generator.state = state["generator"]
+
+
+def _to_json(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not serializable.")
+
+
+class Checkpointable:
+    """
+    state_dict and load_state_dict over the attributes named in _state_attributes.
+    the state of the Checkpointable attributes named in _state_children, such as schedules, is stored
+    under their attribute name as prefix.
+    callables passed to setup are not part of the state and are supplied again by the caller.
+    """
+
+    _state_attributes = ()
+    _state_children = ()
+
+    def state_dict(self):
+        """
+        :return: dict of arrays and scalars, attributes that are None are left out
+        """
+        state = {"rng": get_rng_state(getattr(self, "rng", None))}
+        for name in self._state_attributes:
+            value = getattr(self, name, None)
+            if value is not None:
+                state[name] = value
+        for name in self._state_children:
+            child = getattr(self, name, None)
+            if child is not None:
+                state.update({f"{name}.{key}": value for key, value in child.state_dict().items() if key != "rng"})
+        return state
+
+    def load_state_dict(self, state, restore_global_rng=False):
+        """
+        :param state: dict from state_dict or load_state, attributes missing from it are set to None
+        :param restore_global_rng: also restore the global np.random state saved with it, needed for a bit
+            identical resume when setup callables draw from np.random, but shared by the whole process
+        :return:
+        """
+        for name in self._state_attributes:
+            value = state.get(name)
+            if isinstance(value, np.ndarray) and value.ndim == 0:
+                value = value.item()
+            setattr(self, name, value)
+        if "rng" in state:
+            set_rng_state(np.asarray(state["rng"]).item(), getattr(self, "rng", None), restore_global_rng)
+        for name in self._state_children:
+            child = getattr(self, name, None)
+            if child is not None:
+                prefix = name + "."
+                child.load_state_dict(
+                    {key[len(prefix):]: value for key, value in state.items() if key.startswith(prefix)})
+        return self
+
+
+def save_state(path, state):
+    """
+    write a state dict to an uncompressed npz file, replacing it atomically
+    :param path:
+    :param state:
+    :return:
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        np.savez(f, **{name: np.asarray(value) for name, value in state.items()})
+    os.replace(temp_path, path)
+
+
+def _member_offset(f, info):
+    # data of a stored zip member starts after its local file header
+    f.seek(info.header_offset)
+    header = f.read(30)
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    return info.header_offset + 30 + name_length + extra_length
+
+
+def load_state(path, mmap_threshold=2 ** 20, mmap_mode="c"):
+    """
+    read a state dict written by save_state
+    :param path:
+    :param mmap_threshold: arrays of at least this many bytes are memory mapped instead of read, None to read all
+    :param mmap_mode: numpy.memmap mode, "c" is copy on write so the file is never modified
+    :return: dict of arrays
+    """
+    state = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            name = info.filename[:-len(".npy")] if info.filename.endswith(".npy") else info.filename
+            if mmap_threshold is not None and info.compress_type == zipfile.ZIP_STORED \
+                    and info.file_size >= mmap_threshold:
+                f.seek(_member_offset(f, info))
+                version = np.lib.format.read_magic(f)
+                read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) \
+                    else np.lib.format.read_array_header_2_0
+                shape, fortran_order, dtype = read_header(f)
+                if not dtype.hasobject:
+                    state[name] = np.memmap(
+                        path, dtype=dtype, mode=mmap_mode, offset=f.tell(), shape=shape,
+                        order="F" if fortran_order else "C")
+                    continue
+            with archive.open(info) as member:
+                state[name] = np.lib.format.read_array(member, allow_pickle=False)
+    return state
+
+
+class Checkpoint(Callback):
+    def __init__(self, path, interval=1):
+        """
+        save optimizer.state_dict() to path every interval generations and when optimize ends
+        :param path:
+        :param interval:
+        """
+        self.path = path
+        self.interval = interval
+        self._n_generation = 0
+
+    def on_optimize_begin(self, optimizer):
+        self._n_generation = 0
+
+    def on_generation_end(self, optimizer):
+        self._n_generation += 1
+        if self._n_generation % self.interval == 0:
+            save_state(self.path, optimizer.state_dict())
+
+    def on_optimize_end(self, optimizer):
+        save_state(self.path, optimizer.state_dict())
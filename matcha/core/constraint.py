@@ -0,0 +1,215 @@
+import numpy as np
+
+from matcha.core.evaluator import INFEASIBLE_FITNESS, Evaluator, SerialEvaluator, build_evaluator
+from matcha.core.rng import make_rng
+from matcha.core.surrogate import SurrogateEvaluator
+
+
+class Bounds:
+    methods = ("clip", "reflect", "resample")
+
+    def __init__(self, low, high, method="clip"):
+        """
+        box bounds, applied by the optimizers to every population before it is scored
+        :param low: scalar or (d,) lower bounds
+        :param high: scalar or (d,) upper bounds
+        :param method: "clip" to the nearest bound, "reflect" back from the bound, or "resample" every coordinate
+            out of bounds uniformly between its bounds
+        """
+        if method not in self.methods:
+            raise ValueError(f"unknown bounds method {method}, use one of {self.methods}.")
+        self.low = np.asarray(low, dtype=float)
+        self.high = np.asarray(high, dtype=float)
+        if np.any(self.low > self.high):
+            raise ValueError("low bounds have to be below high bounds.")
+        self.method = method
+
+    def contains(self, population):
+        """
+        :param population: (n, d) population
+        :return: (n,) mask of the individuals within bounds
+        """
+        population = np.asarray(population)
+        return ((population >= self.low) & (population <= self.high)).all(axis=-1)
+
+    def _reflect(self, out):
+        # mirrored back and forth between the bounds, so values far out of bounds still land inside
+        width = np.broadcast_to(self.high - self.low, out.shape)
+        # coordinates with equal bounds are pinned to them
+        shifted = np.where(width > 0, np.mod(out - self.low, np.where(width > 0, 2 * width, 1)), 0)
+        np.add(self.low, np.where(shifted > width, 2 * width - shifted, shifted), out=out)
+
+    def _resample(self, out, rng):
+        outside = (out < self.low) | (out > self.high)
+        if outside.any():
+            low, high = np.broadcast_to(self.low, out.shape)[outside], np.broadcast_to(self.high, out.shape)[outside]
+            out[outside] = make_rng(rng).uniform(low, high)
+
+    def repair(self, population, rng=None, out=None):
+        """
+        :param population: (n, d) population
+        :param rng: numpy Generator of the resample method
+        :param out: array the repaired population is written to, such as population itself
+        :return: repaired population
+        """
+        population = np.asarray(population)
+        if out is None:
+            out = population.copy()
+        elif out is not population:
+            out[...] = population
+        if self.method == "clip":
+            np.clip(out, self.low, self.high, out=out)
+        elif self.method == "reflect":
+            self._reflect(out)
+        else:
+            self._resample(out, rng)
+        return out
+
+
+class Constraints:
+    handlings = ("feasibility", "penalty")
+
+    def __init__(self, inequality, handling="feasibility", penalty=1e3, batch=True):
+        """
+        inequality constraints g(x) <= 0, evaluated before the objective
+        :param inequality: maps the (n, d) population to (n, m) constraint values,
+            or one individual to (m,) values when batch is False
+        :param handling: "feasibility" rules, feasible individuals are better than infeasible ones, which are
+            ranked by their violation and never passed to the objective, or "penalty", the objective of every
+            individual worsened by penalty * violation
+        :param penalty:
+        :param batch:
+        """
+        if handling not in self.handlings:
+            raise ValueError(f"unknown constraint handling {handling}, use one of {self.handlings}.")
+        self.inequality = inequality
+        self.handling = handling
+        self.penalty = penalty
+        self.batch = batch
+
+    def violation(self, population):
+        """
+        :param population: (n, d) population
+        :return: (n,) sum of the positive constraint values, 0 for feasible individuals
+        """
+        if self.batch:
+            values = self.inequality(population)
+        else:
+            values = [self.inequality(i) for i in population]
+        values = np.asarray(values, dtype=float).reshape(len(population), -1)
+        return np.maximum(values, 0).sum(axis=1)
+
+
+class ConstrainedEvaluator(Evaluator):
+    infeasible_fitness = INFEASIBLE_FITNESS
+
+    def __init__(self, evaluator=None, constraints=None, maximize=False):
+        """
+        scores a population under constraints. with the feasibility rules an infeasible individual gets
+        infeasible_fitness worsened by its violation, so it ranks behind every feasible individual
+        whenever it was scored.
+        :param evaluator: wrapped evaluator, SerialEvaluator by default
+        :param constraints: Constraints
+        :param maximize: direction of the fitness, optimizer.maximize
+        """
+        self.evaluator = evaluator if evaluator is not None else SerialEvaluator()
+        self.constraints = constraints
+        self.maximize = maximize
+        # infeasible individuals of the last population, not passed to the objective
+        self.n_skipped = 0
+
+    def evaluate(self, fitness_calculation, population, batch=False):
+        population = np.asarray(population)
+        violation = self.constraints.violation(population)
+        # direction in which a fitness gets worse
+        sign = -1 if self.maximize else 1
+        if self.constraints.handling == "penalty":
+            fitness = np.asarray(self.evaluator.evaluate(fitness_calculation, population, batch), dtype=float)
+            self.n_skipped = getattr(self.evaluator, "n_skipped", 0)
+            return fitness + sign * self.constraints.penalty * violation
+
+        feasible = violation <= 0
+        # float64 whatever the dtype of the objective, the infeasible scores are out of float32 range
+        fitness = np.empty(len(population), dtype=float)
+        self.n_skipped = int((~feasible).sum())
+        if feasible.any():
+            fitness[feasible] = self.evaluator.evaluate(fitness_calculation, population[feasible], batch)
+            self.n_skipped += getattr(self.evaluator, "n_skipped", 0)
+        # violation / (1 + violation) is below 1, so the order of the violations survives the precision of the base
+        violation = violation[~feasible]
+        fitness[~feasible] = sign * self.infeasible_fitness * (1 + violation / (1 + violation))
+        return fitness
+
+    def close(self):
+        self.evaluator.close()
+
+
+def finite_fitness(fitness, maximize=False):
+    """
+    for optimizers using fitness differences within one population, such as a gradient estimate.
+    infeasible scores of the feasibility rules are replaced by the worst feasible fitness of the population
+    worsened by the squashed violation, so their differences stay finite.
+    :param fitness: (n,) fitness, possibly from ConstrainedEvaluator
+    :param maximize: direction of the fitness, optimizer.maximize
+    :return: float64 fitness
+    """
+    fitness = np.asarray(fitness, dtype=float)
+    sign = -1 if maximize else 1
+    infeasible = sign * fitness >= ConstrainedEvaluator.infeasible_fitness
+    if not infeasible.any():
+        return fitness
+    feasible = sign * fitness[~infeasible]
+    base = sign * feasible.max() if len(feasible) else 0.
+    return np.where(infeasible, base + (fitness / ConstrainedEvaluator.infeasible_fitness - sign), fitness)
+
+
+class Constrainable:
+    """
+    evaluation shared by the optimizers scoring positions with a fitness_calculation:
+    the evaluator chain set up from the evaluator, constraints and surrogate of setup,
+    and the repair of every population into the bounds.
+    """
+
+    def _setup_evaluation(
+            self,
+            fitness_calculation,
+            batch=False,
+            evaluator=None,
+            cache_size=None,
+            bounds=None,
+            constraints=None,
+            surrogate=None,
+            screen_fraction=.5
+    ):
+        self.fitness_calculation = fitness_calculation
+        self.bounds = bounds
+        self.batch = batch
+        self.evaluator = build_evaluator(evaluator, cache_size)
+        if constraints is not None:
+            self.evaluator = ConstrainedEvaluator(self.evaluator, constraints, self.maximize)
+        if surrogate is not None:
+            self.evaluator = SurrogateEvaluator(self.evaluator, surrogate, screen_fraction, self.maximize)
+
+    def _finite_fitness(self, fitness):
+        # only the feasibility rules of a ConstrainedEvaluator in the chain produce infeasible scores
+        evaluator = self.evaluator
+        while evaluator is not None:
+            if isinstance(evaluator, ConstrainedEvaluator):
+                if evaluator.constraints.handling == "feasibility":
+                    return finite_fitness(fitness, self.maximize)
+                break
+            evaluator = getattr(evaluator, "evaluator", None)
+        return fitness
+
+    def evaluate(self, population):
+        """
+        :param population: (n, d) population, such as the one from ask
+        :return: (n,) fitness
+        """
+        return self.evaluator.evaluate(self.fitness_calculation, population, self.batch)
+
+    def _repair(self, population):
+        # population is a fresh array, repaired in place
+        if self.bounds is None:
+            return population
+        return self.bounds.repair(population, self.rng, out=population)
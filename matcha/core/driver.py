@@ -0,0 +1,118 @@
+import inspect
+
+import numpy as np
+
+from matcha.core.callback import CallbackList
+from matcha.core.evaluator import SerialEvaluator
+
+
+def drive(optimizer, evaluate, callbacks=None):
+    """
+    the optimize loop of ask/tell optimizers
+    :param optimizer: object with ask, tell and done
+    :param evaluate: maps the (n, d) population from ask to its (n,) fitness
+    :param callbacks: list of Callback
+    :return: optimizer
+    """
+    callbacks = CallbackList(callbacks)
+    callbacks.on_optimize_begin(optimizer)
+    while not optimizer.done:
+        callbacks.on_generation_begin(optimizer)
+        population = optimizer.ask()
+        callbacks.on_evaluation_begin(optimizer)
+        fitness = evaluate(population)
+        callbacks.on_evaluation_end(optimizer, population, fitness)
+        optimizer.tell(fitness)
+        callbacks.on_generation_end(optimizer)
+    callbacks.on_optimize_end(optimizer)
+    return optimizer
+
+
+class AsyncDriver:
+    def __init__(self, evaluate=None, max_concurrency=8, executor=None, callbacks=None):
+        """
+        runs ask/tell optimizers on asyncio with up to max_concurrency evaluations in flight.
+        optimizers driven together share the slots, so while one waits for the slowest individual
+        of its generation the others keep the workers busy.
+        :param evaluate: coroutine function scoring one position, or a plain callable run in executor.
+            if None, every population is scored by optimizer.evaluate in executor, holding one slot,
+            so the evaluator, cache, constraints, surrogate and batch of setup apply
+        :param max_concurrency: number of evaluations in flight
+        :param executor: concurrent.futures executor of plain callables, the loop default if None
+        :param callbacks: list of Callback, called for every driven optimizer
+        """
+        self.evaluate = evaluate
+        self.max_concurrency = max_concurrency
+        self.executor = executor
+        self.callbacks = CallbackList(callbacks)
+        self._semaphore = None
+
+    def _check(self, optimizer):
+        # a per-position evaluate replaces the fitness_calculation and would bypass the evaluator chain
+        evaluator = getattr(optimizer, "evaluator", None)
+        if self.evaluate is None:
+            if not hasattr(optimizer, "evaluate"):
+                raise ValueError("evaluate is required for optimizers without an evaluate method")
+        elif evaluator is not None and type(evaluator) is not SerialEvaluator:
+            raise ValueError(
+                "the evaluator, cache_size, constraints or surrogate of setup are not applied to a per-position "
+                "evaluate, pass evaluate=None to score populations with optimizer.evaluate")
+
+    async def _evaluate(self, position):
+        import asyncio
+
+        async with self._semaphore:
+            if inspect.iscoroutinefunction(self.evaluate):
+                return await self.evaluate(position)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self.evaluate, position)
+
+    async def _evaluate_population(self, optimizer, population):
+        import asyncio
+
+        if self.evaluate is None:
+            async with self._semaphore:
+                loop = asyncio.get_running_loop()
+                return np.asarray(await loop.run_in_executor(self.executor, optimizer.evaluate, population))
+        return np.array(await asyncio.gather(*(self._evaluate(position) for position in population)))
+
+    async def _drive(self, optimizer):
+        self._check(optimizer)
+        self.callbacks.on_optimize_begin(optimizer)
+        while not optimizer.done:
+            self.callbacks.on_generation_begin(optimizer)
+            population = optimizer.ask()
+            self.callbacks.on_evaluation_begin(optimizer)
+            fitness = await self._evaluate_population(optimizer, population)
+            self.callbacks.on_evaluation_end(optimizer, population, fitness)
+            optimizer.tell(fitness)
+            self.callbacks.on_generation_end(optimizer)
+        self.callbacks.on_optimize_end(optimizer)
+        return optimizer
+
+    async def run(self, *optimizers):
+        """
+        drive optimizers until they are done
+        :param optimizers: objects with ask, tell and done
+        :return: list of the optimizers
+        """
+        import asyncio
+
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return list(await asyncio.gather(*(self._drive(optimizer) for optimizer in optimizers)))
+
+
+def optimize_async(optimizers, evaluate=None, max_concurrency=8, executor=None, callbacks=None):
+    """
+    blocking entry of AsyncDriver
+    :param optimizers: list of optimizers with ask, tell and done
+    :param evaluate:
+    :param max_concurrency:
+    :param executor:
+    :param callbacks:
+    :return: list of the optimizers
+    """
+    # asyncio is imported by the async entries only, drive does not pay for it on every import
+    import asyncio
+
+    return asyncio.run(AsyncDriver(evaluate, max_concurrency, executor, callbacks).run(*optimizers))
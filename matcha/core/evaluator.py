@@ -0,0 +1,175 @@
+# concurrent.futures loads its executors on first attribute access, serial runs never import them
+import concurrent.futures
+import os
+
+import numpy as np
+
+from matcha.core.cache import FitnessCache
+from matcha.core.fitness import calculate_fitness
+
+# fitness of infeasible individuals under the feasibility rules of a ConstrainedEvaluator,
+# beyond any fitness an objective returns
+INFEASIBLE_FITNESS = 1e300
+
+
+class Evaluator:
+    """
+    scores a population with a fitness calculation, results are returned in population order
+    """
+
+    def evaluate(self, fitness_calculation, population, batch=False):
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class SerialEvaluator(Evaluator):
+    def evaluate(self, fitness_calculation, population, batch=False):
+        return calculate_fitness(fitness_calculation, population, batch)
+
+
+class ThreadPoolEvaluator(Evaluator):
+    def __init__(self, max_workers=None, chunks_per_worker=1):
+        """
+
+        :param max_workers: number of threads, os.cpu_count() by default
+        :param chunks_per_worker: population is split into max_workers * chunks_per_worker chunks
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunks_per_worker = chunks_per_worker
+        self._executor = None
+
+    def _split(self, population):
+        n_chunks = min(len(population), self.max_workers * self.chunks_per_worker)
+        return np.array_split(population, max(n_chunks, 1))
+
+    def _get_executor(self, fitness_calculation):
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def _submit(self, executor, fitness_calculation, chunks, batch):
+        return executor.map(calculate_fitness, [fitness_calculation] * len(chunks), chunks, [batch] * len(chunks))
+
+    def evaluate(self, fitness_calculation, population, batch=False):
+        population = np.asarray(population)
+        if len(population) == 0:
+            return np.zeros(0)
+        executor = self._get_executor(fitness_calculation)
+        return np.concatenate(list(self._submit(executor, fitness_calculation, self._split(population), batch)))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+_worker_fitness_calculation = None
+
+
+def _initialize_worker(fitness_calculation):
+    global _worker_fitness_calculation
+    _worker_fitness_calculation = fitness_calculation
+
+
+def _evaluate_chunk(chunk, batch):
+    return calculate_fitness(_worker_fitness_calculation, chunk, batch)
+
+
+class ProcessPoolEvaluator(ThreadPoolEvaluator):
+    """
+    the fitness calculation is shipped once to every worker when the pool starts,
+    so it must be picklable (a module level function rather than a lambda).
+    the pool is restarted if it is called with another fitness calculation.
+    """
+
+    def __init__(self, max_workers=None, chunks_per_worker=1, mp_context=None):
+        super().__init__(max_workers, chunks_per_worker)
+        self.mp_context = mp_context
+        self._fitness_calculation = None
+
+    def _get_executor(self, fitness_calculation):
+        if self._executor is not None and self._fitness_calculation is not fitness_calculation:
+            self.close()
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=self.mp_context,
+                initializer=_initialize_worker,
+                initargs=(fitness_calculation,))
+            self._fitness_calculation = fitness_calculation
+        return self._executor
+
+    def _submit(self, executor, fitness_calculation, chunks, batch):
+        return executor.map(_evaluate_chunk, chunks, [batch] * len(chunks))
+
+    def close(self):
+        super().close()
+        self._fitness_calculation = None
+
+
+class CachedEvaluator(Evaluator):
+    def __init__(self, evaluator=None, cache=None):
+        """
+        only positions missing from the cache are passed on to the wrapped evaluator
+        :param evaluator: wrapped evaluator, SerialEvaluator by default
+        :param cache: FitnessCache, or its max_size
+        """
+        self.evaluator = evaluator if evaluator is not None else SerialEvaluator()
+        if not isinstance(cache, FitnessCache):
+            cache = FitnessCache() if cache is None else FitnessCache(cache)
+        self.cache = cache
+        self._fitness_calculation = None
+        self.n_skipped = 0
+
+    def evaluate(self, fitness_calculation, population, batch=False):
+        # cached fitness belongs to a single fitness calculation
+        if self._fitness_calculation is not fitness_calculation:
+            self.cache.clear()
+            self._fitness_calculation = fitness_calculation
+
+        population = np.asarray(population)
+        keys = [self.cache.key(i) for i in population]
+        fitness = [self.cache.get(key) for key in keys]
+
+        # duplicated positions of one population are evaluated once
+        missing = {}
+        for i, (key, value) in enumerate(zip(keys, fitness)):
+            if value is None:
+                missing.setdefault(key, i)
+        # cache hits and duplicates are not passed to the fitness calculation
+        self.n_skipped = len(population) - len(missing)
+        if missing:
+            rows = list(missing.values())
+            for key, row, value in zip(missing, rows, self.evaluator.evaluate(
+                    fitness_calculation, population[rows], batch)):
+                self.cache.put(key, value)
+                fitness[row] = value
+            self.n_skipped += getattr(self.evaluator, "n_skipped", 0)
+            for i, key in enumerate(keys):
+                if fitness[i] is None:
+                    fitness[i] = fitness[missing[key]]
+        return np.array(fitness)
+
+    def close(self):
+        self.evaluator.close()
+
+
+def build_evaluator(evaluator=None, cache_size=None):
+    """
+    evaluator used by the setup of every optimizer
+    :param evaluator: SerialEvaluator by default
+    :param cache_size: wraps the evaluator with a CachedEvaluator of this size if given
+    :return:
+    """
+    evaluator = evaluator if evaluator is not None else SerialEvaluator()
+    if cache_size:
+        evaluator = CachedEvaluator(evaluator, cache_size)
+    return evaluator
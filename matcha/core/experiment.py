@@ -0,0 +1,198 @@
+"""
+grid experiments over the heuristics registered in matcha.core.Factory.
+
+    python -m matcha.core.experiment config.json --output results.jsonl --max-workers 8
+
+a config is a dict, or a list of dicts, of
+    algorithm: registered name such as "pso"
+    params: init params shared by every run
+    grid: init params swept over, name: list of values, every combination is run
+    setup: keyword arguments of setup
+    seeds: seeds of every combination, [0] by default
+strings of params, grid and setup of the form "module:attribute" are imported, such as an objective or a graph.
+
+    {"algorithm": "pso", "params": {"max_iter": 100}, "grid": {"group_size": [20, 40], "w_velocity": [.5, .9]},
+     "setup": {"fitness_calculation": "objectives:rastrigin", "position_initialization": "objectives:position",
+               "velocity_initialization": "objectives:velocity", "batch": true},
+     "seeds": [0, 1, 2]}
+
+results are written as runs finish, to a json lines file or to csv when the output ends with .csv.
+"""
+import argparse
+import csv
+import importlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+
+from matcha.core import Factory
+from matcha.core.callback import EvaluationCounter, FitnessHistory
+
+# declares every heuristic to the Factory, a run only imports the module of its algorithm
+import matcha.heuristic  # noqa: F401
+
+
+def expand(config):
+    """
+    :param config: experiment config, or a list of them
+    :return: list of runs, dicts of algorithm, params, setup and seed
+    """
+    if isinstance(config, (list, tuple)):
+        return [run for item in config for run in expand(item)]
+    grid = config.get("grid", {})
+    runs = []
+    for values in itertools.product(*grid.values()):
+        params = dict(config.get("params", {}), **dict(zip(grid, values)))
+        for seed in config.get("seeds", [0]):
+            runs.append({
+                "algorithm": config["algorithm"],
+                "params": params,
+                "setup": config.get("setup", {}),
+                "seed": seed,
+            })
+    return runs
+
+
+def _resolve(value):
+    if isinstance(value, str) and ":" in value:
+        module, attribute = value.split(":", 1)
+        return getattr(importlib.import_module(module), attribute)
+    return value
+
+
+def _to_json(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if callable(value):
+        return f"{value.__module__}:{value.__qualname__}"
+    raise TypeError(f"{type(value).__name__} is not serializable.")
+
+
+def run_one(run):
+    """
+    create, set up and optimize the optimizer of a run
+    :param run: dict from expand
+    :return: result record, with the error instead of the fitness if the run raised
+    """
+    record = {"algorithm": run["algorithm"], "params": run["params"], "seed": run["seed"]}
+    history, counter = FitnessHistory(), EvaluationCounter()
+    start = time.perf_counter()
+    try:
+        # setup callables drawing from np.random get the seed of the run as well
+        np.random.seed(run["seed"])
+        params = {name: _resolve(value) for name, value in run["params"].items()}
+        optimizer = Factory.create_object(run["algorithm"], dict(params, seed=run["seed"]))
+        if run["setup"]:
+            optimizer.setup(**{name: _resolve(value) for name, value in run["setup"].items()})
+        optimizer.optimize(callbacks=[history, counter])
+        record.update(
+            best_fitness=float(history.best[-1]) if history.best else None,
+            n_iter=optimizer.n_iter,
+            n_evaluation=counter.n_evaluation,
+            error=None)
+    except Exception as e:
+        record.update(best_fitness=None, n_iter=None, n_evaluation=counter.n_evaluation,
+                      error=f"{type(e).__name__}: {e}")
+    record["wall_time"] = time.perf_counter() - start
+    return record
+
+
+class JsonlSink:
+    def __init__(self, path):
+        """
+        one json line per result, flushed as it arrives
+        :param path:
+        """
+        self.file = open(path, "w")
+
+    def write(self, record):
+        self.file.write(json.dumps(record, default=_to_json) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class CsvSink(JsonlSink):
+    """
+    one csv row per result, params are written as a json column as they differ between algorithms
+    """
+
+    fields = ("algorithm", "params", "seed", "best_fitness", "n_iter", "n_evaluation", "wall_time", "error")
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.writer = csv.DictWriter(self.file, fieldnames=self.fields)
+        self.writer.writeheader()
+
+    def write(self, record):
+        self.writer.writerow(dict(record, params=json.dumps(record["params"], default=_to_json)))
+        self.file.flush()
+
+
+def run_experiment(config, sink=None, max_workers=None, executor=None):
+    """
+    run every run of config in parallel, at most max_workers at once
+    :param config: experiment config, or a list of them
+    :param sink: JsonlSink or CsvSink getting every result as it finishes
+    :param max_workers: number of processes, os.cpu_count() by default
+    :param executor: concurrent.futures executor used instead of a process pool
+    :return: list of result records, in finishing order
+    """
+    runs = iter(expand(config))
+    own_executor = executor is None
+    executor = ProcessPoolExecutor(max_workers=max_workers) if own_executor else executor
+    # only a couple of runs per worker are queued, so a large grid is not submitted at once
+    max_pending = 2 * (max_workers or os.cpu_count() or 1)
+    records, pending = [], set()
+    try:
+        while True:
+            for run in itertools.islice(runs, max_pending - len(pending)):
+                pending.add(executor.submit(run_one, run))
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                record = future.result()
+                records.append(record)
+                if sink is not None:
+                    sink.write(record)
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("config", help="json file of the experiment config")
+    parser.add_argument("--output", default="experiment.jsonl", help="json lines, or csv if it ends with .csv")
+    parser.add_argument("--max-workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    with open(args.config) as f:
+        config = json.load(f)
+    sink_type = CsvSink if args.output.endswith(".csv") else JsonlSink
+    with sink_type(args.output) as sink:
+        records = run_experiment(config, sink, args.max_workers)
+    failed = [record for record in records if record["error"] is not None]
+    for record in failed:
+        print(f"{record['algorithm']} {record['params']} seed {record['seed']}: {record['error']}")
+    print(f"{len(records)} runs, {len(failed)} failed, written to {args.output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,31 @@
+import numpy as np
+
+
+def calculate_fitness(fitness_calculation, population, batch=False):
+    """
+    score every individual of a population
+    :param fitness_calculation: objective of a single individual, or of the whole population when batch is True
+    :param population: (n, d) population matrix
+    :param batch: whether fitness_calculation maps an (n, d) matrix to an (n,) fitness vector
+    :return: (n,) fitness vector
+    """
+    if batch:
+        return np.asarray(fitness_calculation(population)).reshape(len(population))
+    return np.array([fitness_calculation(i) for i in population])
+
+
+def replacement(fitness, incoming_fitness, maximize=False):
+    """
+    pair the best incoming individuals with the worst current ones, such as migrants
+    :param fitness: (n,) fitness of the current individuals
+    :param incoming_fitness: (m,) fitness of the incoming individuals
+    :param maximize: direction of the fitness
+    :return: indices into fitness and into incoming_fitness of the pairs where the incoming individual is better
+    """
+    sign = 1 if maximize else -1
+    fitness, incoming_fitness = sign * np.asarray(fitness).reshape(-1), sign * np.asarray(incoming_fitness)
+    n = min(len(fitness), len(incoming_fitness))
+    worst = np.argsort(fitness, kind="stable")[:n]
+    best = np.argsort(-incoming_fitness, kind="stable")[:n]
+    better = incoming_fitness[best] > fitness[worst]
+    return worst[better], best[better]
@@ -0,0 +1,182 @@
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from matcha.core import Factory
+from matcha.core.callback import CallbackList
+from matcha.core.rng import spawn
+
+# declares every heuristic to the Factory, an island only imports the module of its optimizer
+import matcha.heuristic  # noqa: F401
+
+_island_barrier = None
+_island_memory = None
+_island_shape = None
+
+
+def _initialize_island(barrier, memory_name, shape):
+    global _island_barrier, _island_memory, _island_shape
+    _island_barrier = barrier
+    _island_memory = SharedMemory(name=memory_name)
+    _island_shape = shape
+
+
+def _views(buffer, shape):
+    n_island, n_migrant, width = shape
+    migrants = np.ndarray(shape, dtype=float, buffer=buffer)
+    done = np.ndarray((n_island,), dtype=float, buffer=buffer, offset=migrants.nbytes)
+    return migrants, done
+
+
+def _ranked(fitness, maximize):
+    # indices from the best to the worst fitness
+    order = np.argsort(fitness)
+    return order[::-1] if maximize else order
+
+
+def _better(a, b, maximize):
+    return a > b if maximize else a < b
+
+
+def _run_island(index, name, module, init_params, setup_params, interval, callbacks, global_seed):
+    """
+    one island, the optimizer runs interval generations between migrations. migrants are exchanged over
+    shared memory in a ring, island i receiving the best individuals of island i - 1.
+    """
+    try:
+        # forked islands would otherwise repeat the same np.random draws of setup callables
+        np.random.seed(global_seed)
+        importlib.import_module(module)
+        optimizer = Factory.create_object(name, init_params)
+        optimizer.setup(**setup_params)
+        maximize = optimizer.maximize
+        migrants, done = _views(_island_memory.buf, _island_shape)
+        n_island, n_migrant, _ = _island_shape
+        best_position, best_fitness = None, None
+        population, fitness = None, None
+        callbacks = CallbackList(callbacks)
+        callbacks.on_optimize_begin(optimizer)
+
+        while True:
+            for _ in range(interval):
+                if optimizer.done:
+                    break
+                callbacks.on_generation_begin(optimizer)
+                population = optimizer.ask()
+                callbacks.on_evaluation_begin(optimizer)
+                fitness = np.asarray(optimizer.evaluate(population), dtype=float).reshape(-1)
+                callbacks.on_evaluation_end(optimizer, population, fitness)
+
+                best = _ranked(fitness, maximize)[0]
+                if best_fitness is None or _better(fitness[best], best_fitness, maximize):
+                    best_position, best_fitness = np.array(population[best], dtype=float), fitness[best]
+                optimizer.tell(fitness)
+                callbacks.on_generation_end(optimizer)
+
+            # every island publishes its migrants, then reads its neighbor's before anyone writes again
+            migrants[index, :, -1] = -np.inf if maximize else np.inf
+            if fitness is not None:
+                elite = _ranked(fitness, maximize)[:n_migrant]
+                migrants[index, :len(elite), :-1] = population[elite]
+                migrants[index, :len(elite), -1] = fitness[elite]
+            done[index] = optimizer.done
+            _island_barrier.wait()
+            finished = bool(done.all())
+            if not finished and not optimizer.done:
+                # taken in between tell and the next ask, padding rows of fewer elites are never better
+                incoming = migrants[(index - 1) % n_island].copy()
+                optimizer.immigrate(incoming[:, :-1], incoming[:, -1])
+            _island_barrier.wait()
+            if finished:
+                break
+
+        callbacks.on_optimize_end(optimizer)
+        return best_position, best_fitness
+    except BaseException:
+        # release the other islands instead of leaving them waiting on the barrier
+        _island_barrier.abort()
+        raise
+
+
+class IslandModel:
+    def __init__(
+            self,
+            name,
+            init_params=None,
+            setup_params=None,
+            n_island=None,
+            interval=10,
+            n_migrant=1,
+            seed=None,
+            callbacks=None,
+            mp_context=None
+    ):
+        """
+        n_island optimizers created by Factory.create_object(name, init_params), one process each.
+        every interval generations the n_migrant best individuals of every island are passed to
+        optimizer.immigrate of the next island in a ring, which replaces worse individuals with them.
+        only ask/tell optimizers with immigrate can be islands, and every callable of setup_params must be picklable.
+        :param name: name registered in matcha.core.Factory
+        :param init_params: init params of the optimizer, seed is set per island
+        :param setup_params: keyword arguments of optimizer.setup
+        :param n_island: os.cpu_count() by default
+        :param interval: generations between migrations
+        :param n_migrant:
+        :param seed: int, SeedSequence or numpy Generator, spawned into one stream per island
+        :param callbacks: list of Callback, every island runs its own copy
+        :param mp_context: multiprocessing context
+        """
+        if not hasattr(Factory.create_type(name), "immigrate"):
+            raise TypeError(f"{name} cannot take migrants, it has no immigrate method.")
+        self.name = name
+        self.init_params = init_params if init_params is not None else {}
+        self.setup_params = setup_params if setup_params is not None else {}
+        self.n_island = n_island or multiprocessing.cpu_count()
+        self.interval = interval
+        self.n_migrant = n_migrant
+        self.seed = seed
+        self.callbacks = callbacks
+        self.mp_context = mp_context if mp_context is not None else multiprocessing.get_context()
+
+        self.island_best = []
+        self.best_position = None
+        self.best_fitness = None
+
+    def _dimension(self):
+        # the shared block is sized before the islands start, from the population of a probe optimizer
+        probe = Factory.create_object(self.name, self.init_params)
+        probe.setup(**self.setup_params)
+        return np.asarray(probe.ask()).shape[-1]
+
+    def run(self):
+        """
+        run every island to the end and keep the best individual over all islands
+        :return: self
+        """
+        optimizer_type = Factory.create_type(self.name)
+        shape = (self.n_island, self.n_migrant, self._dimension() + 1)
+        memory = SharedMemory(create=True, size=(int(np.prod(shape)) + self.n_island) * np.dtype(float).itemsize)
+        try:
+            barrier = self.mp_context.Barrier(self.n_island)
+            # all islands run at once, as every one of them waits for the others at each migration
+            with ProcessPoolExecutor(
+                    max_workers=self.n_island,
+                    mp_context=self.mp_context,
+                    initializer=_initialize_island,
+                    initargs=(barrier, memory.name, shape)) as executor:
+                futures = [
+                    executor.submit(
+                        _run_island, index, self.name, optimizer_type.__module__, dict(self.init_params, seed=rng),
+                        self.setup_params, self.interval, self.callbacks, int(rng.integers(2 ** 32)))
+                    for index, rng in enumerate(spawn(self.seed, self.n_island))]
+                self.island_best = [future.result() for future in futures]
+        finally:
+            memory.close()
+            memory.unlink()
+
+        key = (lambda x: x[1]) if optimizer_type.maximize else (lambda x: -x[1])
+        self.best_position, self.best_fitness = max(self.island_best, key=key)
+        return self
@@ -0,0 +1,27 @@
+import numpy as np
+
+
+def make_rng(seed=None):
+    """
+    random generator of an optimizer
+    :param seed: int, SeedSequence or numpy Generator, a Generator is used as is. fresh entropy if None
+    :return: numpy Generator on PCG64
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.Generator(np.random.PCG64(seed))
+
+
+def spawn(seed, n):
+    """
+    independent child generators for optimizers or workers running in parallel,
+    the same seed always spawns the same streams
+    :param seed: int, SeedSequence or numpy Generator
+    :param n: number of children
+    :return: list of n numpy Generator
+    """
+    if isinstance(seed, np.random.Generator):
+        return seed.spawn(n)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    return [make_rng(child) for child in seed.spawn(n)]
@@ -0,0 +1,195 @@
+"""
+schedules adapting the step size of EvolutionStrategy and the temperature and step size of SimulatedAnnealing.
+every schedule is reset when optimize starts and is part of the optimizer state.
+"""
+import numpy as np
+
+from matcha.core.checkpoint import Checkpointable
+
+
+def expected_norm(dimension):
+    """
+    :param dimension:
+    :return: approximate expected euclidean norm of a standard normal vector
+    """
+    return np.sqrt(dimension) * (1 - 1 / (4 * dimension) + 1 / (21 * dimension ** 2))
+
+
+class StepSizeSchedule(Checkpointable):
+    """
+    adapts a step size after every iteration, from whether the iteration improved the fitness and from the
+    normalized step taken, with the length expected of a standard normal vector and zero when nothing moved
+    """
+
+    _state_attributes = ("dimension",)
+
+    def reset(self, dimension):
+        self.dimension = dimension
+
+    def update(self, step_size, success, step):
+        return step_size
+
+
+class OneFifthSuccessRule(StepSizeSchedule):
+    def __init__(self, target=.2, damping=None):
+        """
+        the step size grows after a success and shrinks after a failure, it is stable at a success rate of target
+        :param target:
+        :param damping: 1 + dimension / 2 by default
+        """
+        self.target = target
+        self.damping = damping
+        self.dimension = None
+
+    def update(self, step_size, success, step):
+        damping = self.damping or 1 + self.dimension / 2
+        return step_size * np.exp((float(success) - self.target) / (1 - self.target) / damping)
+
+
+class CumulativeStepSizeAdaptation(StepSizeSchedule):
+    _state_attributes = ("dimension", "path")
+
+    def __init__(self, c_sigma=None, damping=None):
+        """
+        the step size grows when consecutive steps point the same way and shrinks when they cancel out,
+        judged by the length of their evolution path against the expected length of a standard normal vector
+        :param c_sigma: learning rate of the path, 3 / (dimension + 6) by default
+        :param damping: 1 + c_sigma by default
+        """
+        self.c_sigma = c_sigma
+        self.damping = damping
+        self.dimension = None
+        self.path = None
+
+    def reset(self, dimension):
+        self.dimension = dimension
+        self.path = np.zeros(dimension)
+
+    def update(self, step_size, success, step):
+        n = self.dimension
+        c_sigma = self.c_sigma or 3 / (n + 6)
+        damping = self.damping or 1 + c_sigma
+        self.path = (1 - c_sigma) * self.path + np.sqrt(c_sigma * (2 - c_sigma)) * np.ravel(step)
+        return step_size * np.exp(c_sigma / damping * (np.linalg.norm(self.path) / expected_norm(n) - 1))
+
+
+class GradientUpdate(Checkpointable):
+    """
+    maps a gradient estimate to the step subtracted from the position, plain gradient descent by default
+    """
+
+    def reset(self, shape):
+        pass
+
+    def step(self, gradient, learning_rate):
+        return learning_rate * gradient
+
+
+class Adam(GradientUpdate):
+    _state_attributes = ("moment", "second_moment", "n_step")
+
+    def __init__(self, beta_1=.9, beta_2=.999, epsilon=1e-8):
+        """
+        gradient descent with bias corrected moving averages of the gradient and of its square,
+        every coordinate moves by about learning_rate whatever the scale of its gradient
+        :param beta_1:
+        :param beta_2:
+        :param epsilon:
+        """
+        self.beta_1 = beta_1
+        self.beta_2 = beta_2
+        self.epsilon = epsilon
+        self.moment = None
+        self.second_moment = None
+        self.n_step = 0
+
+    def reset(self, shape):
+        self.moment = np.zeros(shape)
+        self.second_moment = np.zeros(shape)
+        self.n_step = 0
+
+    def step(self, gradient, learning_rate):
+        self.n_step += 1
+        self.moment = self.beta_1 * self.moment + (1 - self.beta_1) * gradient
+        self.second_moment = self.beta_2 * self.second_moment + (1 - self.beta_2) * np.square(gradient)
+        moment = self.moment / (1 - self.beta_1 ** self.n_step)
+        second_moment = self.second_moment / (1 - self.beta_2 ** self.n_step)
+        return (learning_rate * moment / (np.sqrt(second_moment) + self.epsilon)).astype(gradient.dtype, copy=False)
+
+
+class CoolingSchedule(Checkpointable):
+    """
+    lowers the temperature after every iteration, from the acceptance and the fitness of the current states.
+    temperatures, accepted and fitness are scalars for one chain or (n_chain,) arrays.
+    """
+
+    def reset(self, temperature):
+        pass
+
+    def update(self, temperature, n_iter, accepted, fitness):
+        return temperature
+
+
+class ExponentialCooling(CoolingSchedule):
+    def __init__(self, alpha=.95, min_temperature=1e-12):
+        """
+        temperature * alpha after every iteration
+        :param alpha:
+        :param min_temperature:
+        """
+        self.alpha = alpha
+        self.min_temperature = min_temperature
+
+    def update(self, temperature, n_iter, accepted, fitness):
+        return np.maximum(temperature * self.alpha, self.min_temperature)
+
+
+class LogarithmicCooling(CoolingSchedule):
+    _state_attributes = ("initial_temperature",)
+
+    def __init__(self):
+        """
+        initial_temperature * ln(2) / ln(n_iter + 2), slow enough to converge in probability to a global optimum
+        """
+        self.initial_temperature = None
+
+    def reset(self, temperature):
+        self.initial_temperature = np.asarray(temperature, dtype=float)
+
+    def update(self, temperature, n_iter, accepted, fitness):
+        return self.initial_temperature * np.log(2) / np.log(n_iter + 2)
+
+
+class AdaptiveCooling(CoolingSchedule):
+    _state_attributes = ("fitness_mean", "fitness_square")
+
+    def __init__(self, rate=.5, window=.1, min_factor=.5):
+        """
+        temperature * exp(-rate * temperature / std), std is the standard deviation of the fitness of the current
+        states, so the temperature is lowered slowly while the fitness still fluctuates a lot
+        :param rate:
+        :param window: weight of the latest fitness in the moving mean and variance
+        :param min_factor: lower bound of the factor applied per iteration
+        """
+        self.rate = rate
+        self.window = window
+        self.min_factor = min_factor
+        self.fitness_mean = None
+        self.fitness_square = None
+
+    def reset(self, temperature):
+        self.fitness_mean = None
+        self.fitness_square = None
+
+    def update(self, temperature, n_iter, accepted, fitness):
+        fitness = np.asarray(fitness, dtype=float)
+        if self.fitness_mean is None:
+            self.fitness_mean, self.fitness_square = fitness, np.square(fitness)
+        else:
+            self.fitness_mean = (1 - self.window) * self.fitness_mean + self.window * fitness
+            self.fitness_square = (1 - self.window) * self.fitness_square + self.window * np.square(fitness)
+        std = np.sqrt(np.maximum(self.fitness_square - np.square(self.fitness_mean), 0))
+        # the temperature is kept until the fitness has fluctuated
+        with np.errstate(divide="ignore", invalid="ignore"):
+            factor = np.where(std > 0, np.exp(-self.rate * temperature / std), 1.)
+        return temperature * np.maximum(factor, self.min_factor)
@@ -0,0 +1,183 @@
+import time
+
+import numpy as np
+
+from matcha.core.callback import Callback, count_evaluations
+
+
+class StoppingCriterion(Callback):
+    """
+    callback setting optimizer.stopped, which ends optimize after the current generation
+    """
+
+    def __init__(self):
+        self.triggered = False
+
+    def on_optimize_begin(self, optimizer):
+        self.triggered = False
+
+    def _stop(self, optimizer):
+        self.triggered = True
+        optimizer.stopped = True
+
+    @staticmethod
+    def _best(optimizer, fitness):
+        return np.max(fitness) if optimizer.maximize else np.min(fitness)
+
+
+class Patience(StoppingCriterion):
+    def __init__(self, patience, min_delta=0.):
+        """
+        stop when the best fitness has not improved by more than min_delta for patience generations
+        :param patience:
+        :param min_delta:
+        """
+        super().__init__()
+        self.patience = patience
+        self.min_delta = min_delta
+        self._best_fitness = None
+        self._wait = 0
+
+    def on_optimize_begin(self, optimizer):
+        super().on_optimize_begin(optimizer)
+        self._best_fitness = None
+        self._wait = 0
+
+    def on_evaluation_end(self, optimizer, population, fitness):
+        if not len(fitness):
+            return
+        best = self._best(optimizer, fitness)
+        sign = 1 if optimizer.maximize else -1
+        if self._best_fitness is None or sign * (best - self._best_fitness) > self.min_delta:
+            self._best_fitness = best
+            self._wait = -1
+
+    def on_generation_end(self, optimizer):
+        self._wait += 1
+        if self._wait >= self.patience:
+            self._stop(optimizer)
+
+
+class TargetFitness(StoppingCriterion):
+    def __init__(self, target):
+        """
+        stop when an evaluated fitness reaches target
+        :param target:
+        """
+        super().__init__()
+        self.target = target
+
+    def on_evaluation_end(self, optimizer, population, fitness):
+        if not len(fitness):
+            return
+        best = self._best(optimizer, fitness)
+        if (best >= self.target) if optimizer.maximize else (best <= self.target):
+            self._stop(optimizer)
+
+
+class EvaluationBudget(StoppingCriterion):
+    def __init__(self, max_evaluation):
+        """
+        stop when max_evaluation fitness calculations have been spent
+        :param max_evaluation:
+        """
+        super().__init__()
+        self.max_evaluation = max_evaluation
+        self.n_evaluation = 0
+
+    def on_optimize_begin(self, optimizer):
+        super().on_optimize_begin(optimizer)
+        self.n_evaluation = 0
+
+    def on_evaluation_end(self, optimizer, population, fitness):
+        self.n_evaluation += count_evaluations(optimizer, fitness)
+        if self.n_evaluation >= self.max_evaluation:
+            self._stop(optimizer)
+
+
+class TimeBudget(StoppingCriterion):
+    def __init__(self, seconds, clock=time.monotonic):
+        """
+        stop when optimize has run for seconds
+        :param seconds:
+        :param clock:
+        """
+        super().__init__()
+        self.seconds = seconds
+        self.clock = clock
+        self._start = None
+
+    def on_optimize_begin(self, optimizer):
+        super().on_optimize_begin(optimizer)
+        self._start = self.clock()
+
+    def on_generation_end(self, optimizer):
+        if self.clock() - self._start >= self.seconds:
+            self._stop(optimizer)
+
+
+def population_spread(optimizer, population):
+    """
+    mean standard deviation over the dimensions of the evaluated population
+    """
+    population = np.asarray(population, dtype=float)
+    if len(population) < 2:
+        return None
+    return float(population.reshape(len(population), -1).std(axis=0).mean())
+
+
+def distribution_spread(optimizer, population):
+    """
+    largest standard deviation of the search distribution of GaussianProcessEvolutionStrategy (variance)
+    or CovarianceMatrixAdaptionEvolutionStrategy (step size and covariance)
+    """
+    if getattr(optimizer, "step_size", None) is not None:
+        covariance = np.asarray(optimizer.covariance)
+        variance = np.diag(covariance) if covariance.ndim == 2 else covariance
+        return float(optimizer.step_size * np.sqrt(variance.max()))
+    return float(np.sqrt(np.max(optimizer.variance)))
+
+
+def pheromone_entropy(optimizer, population):
+    """
+    mean entropy of the next spot distribution of every spot of AntColonyOptimization, normalized to [0, 1]
+    """
+    pheromone = np.asarray(optimizer.pheromone, dtype=float)
+    logits = pheromone - pheromone.max(axis=1, keepdims=True)
+    probability = np.exp(logits)
+    probability /= probability.sum(axis=1, keepdims=True)
+    entropy = -np.sum(probability * np.log(np.maximum(probability, 1e-300)), axis=1)
+    return float(entropy.mean() / np.log(pheromone.shape[1]))
+
+
+class DiversityCollapse(StoppingCriterion):
+    def __init__(self, threshold, measure=population_spread, patience=1):
+        """
+        stop when the diversity of the population or the search distribution falls below threshold
+        :param threshold:
+        :param measure: maps (optimizer, evaluated population) to a diversity, such as population_spread,
+            distribution_spread or pheromone_entropy. None values are ignored.
+        :param patience: number of consecutive generations below threshold
+        """
+        super().__init__()
+        self.threshold = threshold
+        self.measure = measure
+        self.patience = patience
+        self._population = None
+        self._below = 0
+
+    def on_optimize_begin(self, optimizer):
+        super().on_optimize_begin(optimizer)
+        self._population = None
+        self._below = 0
+
+    def on_evaluation_end(self, optimizer, population, fitness):
+        self._population = population
+
+    def on_generation_end(self, optimizer):
+        diversity = self.measure(optimizer, self._population)
+        if diversity is None:
+            return
+        self._below = self._below + 1 if diversity < self.threshold else 0
+        if self._below >= self.patience:
+            self._stop(optimizer)
@@ -0,0 +1,191 @@
+import math
+
+import numpy as np
+
+from matcha.core.evaluator import INFEASIBLE_FITNESS, Evaluator, SerialEvaluator
+
+
+class Archive:
+    def __init__(self, max_size=None):
+        """
+        every (position, fitness) pair evaluated so far, stored in buffers grown by doubling
+        :param max_size: keep only the most recent max_size pairs, None to keep all
+        """
+        self.max_size = max_size
+        self._positions = None
+        self._fitness = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def positions(self):
+        return self._positions[: self._size]
+
+    @property
+    def fitness(self):
+        return self._fitness[: self._size]
+
+    def _reserve(self, size, dimension):
+        if self._positions is None:
+            self._positions = np.empty((max(size, 64), dimension))
+            self._fitness = np.empty(max(size, 64))
+        elif size > len(self._positions):
+            capacity = max(size, 2 * len(self._positions))
+            self._positions = np.resize(self._positions, (capacity, dimension))
+            self._fitness = np.resize(self._fitness, capacity)
+
+    def add(self, positions, fitness):
+        positions = np.asarray(positions, dtype=float).reshape(len(fitness), -1)
+        fitness = np.asarray(fitness, dtype=float).reshape(-1)
+        self._reserve(self._size + len(fitness), positions.shape[1])
+        self._positions[self._size: self._size + len(fitness)] = positions
+        self._fitness[self._size: self._size + len(fitness)] = fitness
+        self._size += len(fitness)
+        if self.max_size is not None and self._size > self.max_size:
+            # the oldest pairs are dropped by shifting the most recent ones to the front
+            start = self._size - self.max_size
+            self._positions[: self.max_size] = self._positions[start: self._size]
+            self._fitness[: self.max_size] = self._fitness[start: self._size]
+            self._size = self.max_size
+
+
+def _squared_distance(a, b):
+    # (n, m) squared euclidean distances without the (n, m, d) difference block
+    distance = np.square(a).sum(axis=1)[:, np.newaxis] + np.square(b).sum(axis=1)[np.newaxis, :] - 2 * a @ b.T
+    return np.maximum(distance, 0, out=distance)
+
+
+class KNNRegressor:
+    def __init__(self, k=5, power=2):
+        """
+        inverse distance weighted mean of the k nearest archived fitness, fitting only keeps the archive
+        :param k:
+        :param power: weights are 1 / distance ** power
+        """
+        self.k = k
+        self.power = power
+        self.positions = None
+        self.fitness = None
+
+    def fit(self, positions, fitness):
+        self.positions = positions
+        self.fitness = fitness
+        return self
+
+    def predict(self, positions):
+        distance = np.sqrt(_squared_distance(np.asarray(positions, dtype=float), self.positions))
+        k = min(self.k, distance.shape[1])
+        nearest = np.argpartition(distance, k - 1, axis=1)[:, :k]
+        distance = np.take_along_axis(distance, nearest, axis=1)
+        # an archived position is predicted as its own fitness
+        weights = 1 / np.maximum(distance, 1e-12) ** self.power
+        return (weights * self.fitness[nearest]).sum(axis=1) / weights.sum(axis=1)
+
+
+class RBFRegressor:
+    def __init__(self, max_points=500, smoothing=1e-10):
+        """
+        cubic radial basis function interpolation with a linear tail, fitted on the most recent points
+        :param max_points: size bound of the (m, m) linear system solved by every fit
+        :param smoothing: added to the diagonal of the kernel matrix
+        """
+        self.max_points = max_points
+        self.smoothing = smoothing
+        self.centers = None
+        self.weights = None
+        self.coefficients = None
+
+    def _tail(self, positions):
+        # linear tail when there are enough points to fit it, a constant otherwise
+        ones = np.ones((len(positions), 1))
+        if self.centers is not None and len(self.centers) <= positions.shape[1] + 1:
+            return ones
+        return np.hstack([ones, positions])
+
+    def fit(self, positions, fitness):
+        positions = np.asarray(positions, dtype=float)[-self.max_points:]
+        fitness = np.asarray(fitness, dtype=float)[-self.max_points:]
+        self.centers = positions
+        kernel = np.sqrt(_squared_distance(positions, positions)) ** 3
+        kernel[np.diag_indices_from(kernel)] += self.smoothing
+        tail = self._tail(positions)
+        m, t = tail.shape
+        system = np.zeros((m + t, m + t))
+        system[:m, :m] = kernel
+        system[:m, m:] = tail
+        system[m:, :m] = tail.T
+        target = np.concatenate([fitness, np.zeros(t)])
+        try:
+            solution = np.linalg.solve(system, target)
+        except np.linalg.LinAlgError:
+            # duplicated centers make the system singular
+            solution = np.linalg.lstsq(system, target, rcond=None)[0]
+        self.weights, self.coefficients = solution[:m], solution[m:]
+        return self
+
+    def predict(self, positions):
+        positions = np.asarray(positions, dtype=float)
+        kernel = np.sqrt(_squared_distance(positions, self.centers)) ** 3
+        return kernel @ self.weights + self._tail(positions) @ self.coefficients
+
+
+class SurrogateEvaluator(Evaluator):
+    def __init__(self, evaluator=None, surrogate=None, fraction=.5, maximize=False, min_archive=10, archive_size=None):
+        """
+        pre-screening of every population with a surrogate fitted to all pairs evaluated so far.
+        only the fraction of candidates ranked best by the surrogate is passed on to the wrapped evaluator,
+        the others get the worst fitness, -inf when maximizing and inf otherwise, so they are never selected.
+        :param evaluator: wrapped evaluator, SerialEvaluator by default
+        :param surrogate: object with fit(positions, fitness) and predict(positions), KNNRegressor by default
+        :param fraction: share of every population really evaluated
+        :param maximize: direction of the fitness, optimizer.maximize
+        :param min_archive: populations are evaluated in full until the archive holds this many pairs
+        :param archive_size: Archive max_size
+        """
+        self.evaluator = evaluator if evaluator is not None else SerialEvaluator()
+        self.surrogate = surrogate if surrogate is not None else KNNRegressor()
+        self.fraction = fraction
+        self.maximize = maximize
+        self.min_archive = min_archive
+        self.archive = Archive(archive_size)
+        # candidates passed on to the wrapped evaluator in total, and candidates of the last population
+        # that did not reach the objective, screened out here or skipped by the wrapped evaluator
+        self.n_evaluation = 0
+        self.n_skipped = 0
+        self._fitness_calculation = None
+
+    def _screen(self, population):
+        """
+        :return: indices of the candidates to evaluate
+        """
+        n = len(population)
+        if len(self.archive) < self.min_archive:
+            return np.arange(n)
+        predicted = self.surrogate.predict(population.reshape(n, -1))
+        order = np.argsort(-predicted if self.maximize else predicted, kind="stable")
+        return order[: max(1, math.ceil(self.fraction * n))]
+
+    def evaluate(self, fitness_calculation, population, batch=False):
+        # archived fitness belongs to a single fitness calculation
+        if self._fitness_calculation is not fitness_calculation:
+            self.archive = Archive(self.archive.max_size)
+            self._fitness_calculation = fitness_calculation
+
+        population = np.asarray(population)
+        chosen = self._screen(population)
+        fitness = np.full(len(population), -np.inf if self.maximize else np.inf)
+        fitness[chosen] = self.evaluator.evaluate(fitness_calculation, population[chosen], batch)
+        self.n_evaluation += len(chosen)
+        self.n_skipped = len(population) - len(chosen) + getattr(self.evaluator, "n_skipped", 0)
+
+        # infeasible scores of a wrapped ConstrainedEvaluator are no regression targets
+        chosen = chosen[np.abs(fitness[chosen]) < INFEASIBLE_FITNESS]
+        if len(chosen):
+            self.archive.add(population[chosen].reshape(len(chosen), -1), fitness[chosen])
+            self.surrogate.fit(self.archive.positions, self.archive.fitness)
+        return fitness
+
+    def close(self):
+        self.evaluator.close()
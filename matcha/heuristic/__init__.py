@@ -0,0 +1,39 @@
+"""
+optimizers of matcha, every submodule is only imported when one of its optimizers is first used.
+
+    from matcha.heuristic import ParticularSwarmOptimization
+    Factory.create_object("pso", init_params)
+
+importing the package declares the names of all optimizers to matcha.core.Factory.
+"""
+import importlib
+
+from matcha.core import Factory
+
+# class name: (name registered in Factory, module)
+_optimizers = {
+    "ParticularSwarmOptimization": ("pso", "matcha.heuristic.pso"),
+    "EvolutionStrategy": ("es", "matcha.heuristic.es"),
+    "GaussianProcessEvolutionStrategy": ("gpes", "matcha.heuristic.es"),
+    "CovarianceMatrixAdaptionEvolutionStrategy": ("cmaes", "matcha.heuristic.es"),
+    "SeparableCovarianceMatrixAdaptionEvolutionStrategy": ("sepcmaes", "matcha.heuristic.es"),
+    "SimulatedAnnealing": ("sa", "matcha.heuristic.sa"),
+    "MultiChainSimulatedAnnealing": ("mcsa", "matcha.heuristic.sa"),
+    "ArtificialFishSwarm": ("afs", "matcha.heuristic.afs"),
+    "AntColonyOptimization": ("aco", "matcha.heuristic.aco"),
+}
+
+for _name, _module in _optimizers.values():
+    Factory.register_lazy(_name, _module)
+
+__all__ = list(_optimizers)
+
+
+def __getattr__(name):
+    if name in _optimizers:
+        return getattr(importlib.import_module(_optimizers[name][1]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
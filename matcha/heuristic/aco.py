@@ -1,9 +1,78 @@
 import numpy as np
 
+from matcha.core import Factory
+from matcha.core.callback import CallbackList
+from matcha.core.checkpoint import Checkpointable
+from matcha.core.rng import make_rng
+
+
+def nearest_spots(graph, n_candidate, chunk_elements=2 ** 22):
+    """
+    candidate list of every spot, computed once from the distance matrix
+    :param graph: (n, n) distance matrix
+    :param n_candidate: number of nearest spots kept for every spot
+    :param chunk_elements: bound of the block of rows copied at once, the graph itself is never copied
+    :return: (n, n_candidate) spot indices, nearest first
+    """
+    n = graph.shape[0]
+    n_candidate = min(n_candidate, n - 1)
+    result = np.empty((n, n_candidate), dtype=np.intp)
+    rows = max(1, chunk_elements // max(n, 1))
+    for start in range(0, n, rows):
+        stop = min(start + rows, n)
+        distance = np.array(graph[start:stop], dtype=float)
+        distance[np.arange(stop - start), np.arange(start, stop)] = np.inf
+        candidates = np.argpartition(distance, n_candidate - 1, axis=1)[:, :n_candidate]
+        order = np.argsort(np.take_along_axis(distance, candidates, axis=1), axis=1)
+        result[start:stop] = np.take_along_axis(candidates, order, axis=1)
+    return result
+
+
+class ScaledPheromone:
+    def __init__(self, shape, dtype=np.float32, min_scale=1e-20):
+        """
+        pheromone stored as values * scale, so decaying every edge only updates the scale
+        :param shape:
+        :param dtype:
+        :param min_scale: the scale is folded back into the values below this, to keep them in range
+        """
+        self.values = np.zeros(shape, dtype=dtype)
+        self.scale = 1.
+        self.min_scale = min_scale
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def dtype(self):
+        return self.values.dtype
+
+    def __getitem__(self, key):
+        return self.values[key] * self.scale
+
+    def __array__(self, dtype=None, copy=None):
+        array = self.values * self.scale
+        return array if dtype is None else array.astype(dtype, copy=False)
+
+    def decay(self, rate):
+        self.scale *= rate
+        if self.scale < self.min_scale:
+            self.values *= self.dtype.type(self.scale)
+            self.scale = 1.
+
+    def deposit(self, rows, columns, amounts):
+        np.add.at(self.values, (rows, columns), (amounts / self.scale).astype(self.dtype))
+
+    def clip(self, low, high):
+        np.clip(self.values, low / self.scale, high / self.scale, out=self.values)
+
 
 class Ant:
-    def __init__(self, graph):
+    def __init__(self, graph, candidates=None, rng=None):
         self.graph = graph
+        self.candidates = candidates
+        self.rng = make_rng(rng)
         self.spots = np.arange(graph.shape[0])
         self.pheromone = None
         self.mask = np.zeros(shape=(1, graph.shape[0]))
@@ -28,10 +97,20 @@ class Ant:
         # use pheromone as logits for probability calculation
         # use mask to push down logits and probability
         # use safe softmax to avoid overflow
-        logits = self.pheromone[self.current_spot, :] + self.mask
+        # with a candidate list only unvisited candidates are considered, full scan when all are visited
+        spots = None
+        if self.candidates is not None:
+            candidates = self.candidates[self.current_spot]
+            candidates = candidates[self.mask[candidates] == 0]
+            if len(candidates):
+                spots = candidates
+                logits = self.pheromone[self.current_spot, candidates]
+        if spots is None:
+            spots = self.spots
+            logits = self.pheromone[self.current_spot, :] + self.mask
         safe_exp = np.exp(logits - logits.max())
         prob = safe_exp / safe_exp.sum()
-        next_spot = np.random.choice(self.spots, p=prob.reshape(-1))
+        next_spot = self.rng.choice(spots, p=prob.reshape(-1))
         return next_spot
 
     def _update_status(self, next_spot):
@@ -50,36 +129,236 @@ class Ant:
         return self.path
 
 
-class AntColonyOptimization:
-    def __init__(self, graph, group_size, max_iter, decay=.9):
+class Colony:
+    def __init__(self, graph, group_size, candidates=None, rng=None):
+        """
+        all ants of a colony advancing together, one (ants, n) logit matrix per step
+        :param graph:
+        :param group_size:
+        :param candidates: (n, k) candidate list, restricts every step to (ants, k) logits
+        :param rng: numpy Generator
+        """
         self.graph = graph
-        self.pheromone = np.zeros_like(graph)
-        self.ant_group = [Ant(self.graph) for i in range(group_size)]
+        self.group_size = group_size
+        self.candidates = candidates
+        self.rng = make_rng(rng)
+        self.pheromone = None
+
+    def set_pheromone(self, pheromone):
+        self.pheromone = pheromone
+
+    def _sample(self, logits):
+        # gumbel-max trick: argmax of logits plus gumbel noise samples from softmax(logits)
+        return np.argmax(logits + self.rng.gumbel(size=logits.shape), axis=1)
+
+    def _choose_next_spots(self, current_spots, visited):
+        if self.candidates is None:
+            return self._sample(np.where(visited, -np.inf, self.pheromone[current_spots]))
+
+        candidates = self.candidates[current_spots]
+        candidate_visited = np.take_along_axis(visited, candidates, axis=1)
+        logits = np.where(candidate_visited, -np.inf, self.pheromone[current_spots[:, np.newaxis], candidates])
+        next_spots = np.take_along_axis(candidates, self._sample(logits)[:, np.newaxis], axis=1)[:, 0]
+
+        # fall back to a full scan for ants whose candidates are all visited
+        exhausted = candidate_visited.all(axis=1)
+        if exhausted.any():
+            next_spots[exhausted] = self._sample(
+                np.where(visited[exhausted], -np.inf, self.pheromone[current_spots[exhausted]]))
+        return next_spots
+
+    def search_paths(self, start_spot):
+        n_spot = self.graph.shape[0]
+        ants = np.arange(self.group_size)
+        paths = np.empty(shape=(self.group_size, n_spot), dtype=np.intp)
+        paths[:, 0] = start_spot
+        distances = np.zeros(self.group_size)
+        visited = np.zeros(shape=(self.group_size, n_spot), dtype=bool)
+        visited[:, start_spot] = True
+        for step in range(1, n_spot):
+            current_spots = paths[:, step - 1]
+            next_spots = self._choose_next_spots(current_spots, visited)
+            visited[ants, next_spots] = True
+            distances += self.graph[current_spots, next_spots]
+            paths[:, step] = next_spots
+        return paths, distances
+
+
+@Factory.register("aco")
+class AntColonyOptimization(Checkpointable):
+    maximize = False
+    _state_attributes = ("n_iter", "pheromone", "best_path", "best_distance")
+
+    def __init__(
+            self,
+            graph,
+            group_size,
+            max_iter,
+            decay=.9,
+            vectorized=False,
+            n_candidate=None,
+            seed=None,
+            low_memory=False,
+            lazy_decay=False,
+            local_search=None,
+            n_local_search=1,
+            pheromone_bounds=None,
+            dtype=None
+    ):
+        """
+
+        :param graph: (n, n) distance matrix
+        :param group_size: number of ants
+        :param max_iter:
+        :param decay:
+        :param vectorized: advance all ants together with a Colony instead of one Ant at a time
+        :param n_candidate: sample only among the n_candidate nearest unvisited spots, None for all spots
+        :param seed: int, SeedSequence or numpy Generator of the random draws, shared by all ants
+        :param low_memory: keep the pheromone in float32 instead of float64, same as dtype=np.float32
+        :param lazy_decay: keep the pheromone as a ScaledPheromone, decay is O(1) instead of O(n^2)
+        :param local_search: maps a path to an improved path starting at the same spot,
+            such as matcha.heuristic.local_search.TourLocalSearch, None to keep the constructed paths
+        :param n_local_search: number of the shortest paths of every iteration passed to local_search
+        :param pheromone_bounds: (low, high) the pheromone is clipped to after every update, or "mmas" for
+            the Max-Min bounds derived from the best distance, high = 1 / ((1 - decay) * best_distance)
+        :param dtype: dtype of the pheromone, float64 by default whatever the dtype of graph
+        """
+        self.graph = graph
+        self.rng = make_rng(seed)
+        self.low_memory = low_memory
+        self.lazy_decay = lazy_decay
+        self.dtype = np.dtype(dtype if dtype is not None else np.float32 if low_memory else float)
+        self.pheromone = self._new_pheromone()
+        self.vectorized = vectorized
+        self.candidates = nearest_spots(graph, n_candidate) if n_candidate else None
+        self.ant_group = [
+            Ant(self.graph, self.candidates, self.rng) for i in range(group_size)] if not vectorized else []
+        self.colony = Colony(self.graph, group_size, self.candidates, self.rng) if vectorized else None
         self.max_iter = max_iter
         self.decay = decay
+        self.local_search = local_search
+        self.n_local_search = n_local_search
+        self.pheromone_bounds = pheromone_bounds
+        self.n_iter = 0
+        self.stopped = False
         self.best_path = None
         self.best_distance = np.inf
 
-    def optimize(self, start_spot=0):
-        n_iter = 0
-        while n_iter < self.max_iter:
-            # initialize pheromone matrix for current iteration
-            temp_pheromone = np.zeros_like(self.pheromone)
-            for ant in self.ant_group:
-                # set historical pheromone matrix for current ant
-                ant.set_pheromone(self.pheromone)
-                path = ant.search_path(start_spot)
-
-                # update current pheromone matrix
-                for i, j in zip(path, path[1:]):
-                    temp_pheromone[i, j] += 1 / ant.distance
-
-                # update best record
-                if ant.distance < self.best_distance:
-                    self.best_distance = ant.distance
-                    self.best_path = ant.path
-            n_iter += 1
+    def _new_pheromone(self, values=None):
+        dtype = self.dtype
+        if self.lazy_decay:
+            pheromone = ScaledPheromone(self.graph.shape, dtype)
+            if values is not None:
+                pheromone.values[...] = values
+            return pheromone
+        if values is not None:
+            return np.array(values, dtype=dtype)
+        return np.zeros(self.graph.shape, dtype=dtype)
+
+    def _search_paths(self, start_spot):
+        if self.colony is not None:
+            self.colony.set_pheromone(self.pheromone)
+            return self.colony.search_paths(start_spot)
+
+        paths, distances = [], []
+        for ant in self.ant_group:
+            # set historical pheromone matrix for current ant
+            ant.set_pheromone(self.pheromone)
+            paths.append(ant.search_path(start_spot))
+            distances.append(ant.distance)
+        return np.array(paths, dtype=np.intp), np.array(distances)
+
+    def _improve_paths(self, paths, distances):
+        # local search is spent on the shortest paths of the iteration only
+        for i in np.argsort(distances)[: self.n_local_search]:
+            paths[i] = self.local_search(paths[i])
+            distances[i] = self.graph[paths[i, :-1], paths[i, 1:]].sum()
+
+    def _bounds(self, p_best=.05):
+        if self.pheromone_bounds != "mmas":
+            return self.pheromone_bounds
+        n = self.graph.shape[0]
+        high = 1 / ((1 - self.decay) * self.best_distance)
+        root = p_best ** (1 / n)
+        return high * (1 - root) / (max(n / 2 - 1, 1) * root), high
+
+    def _deposit_pheromone(self, paths, distances):
+        """
+        sparse deposit of the traversed edges only, instead of a dense (n, n) matrix per iteration
+        :return: rows, columns and amounts of every edge of every path, 1 / distance of its ant
+        """
+        rows, columns = paths[:, :-1].ravel(), paths[:, 1:].ravel()
+        amounts = np.repeat(1 / np.asarray(distances, dtype=float), paths.shape[1] - 1)
+        return rows, columns, amounts
+
+    def _update_pheromone(self, rows, columns, amounts):
+        # decay in place, then scatter-add the deposits, repeated edges are summed by add.at
+        bounds = self._bounds()
+        if self.lazy_decay:
+            self.pheromone.decay(self.decay)
+            self.pheromone.deposit(rows, columns, amounts)
+            if bounds is not None:
+                self.pheromone.clip(*bounds)
+            return
+        self.pheromone *= self.decay
+        np.add.at(self.pheromone, (rows, columns), amounts.astype(self.pheromone.dtype))
+        if bounds is not None:
+            np.clip(self.pheromone, *bounds, out=self.pheromone)
+
+    def _update_best(self, paths, distances):
+        best = np.argmin(distances)
+        if distances[best] < self.best_distance:
+            self.best_distance = distances[best]
+            self.best_path = paths[best].tolist()
+
+    @property
+    def done(self):
+        return self.stopped or self.n_iter >= self.max_iter
+
+    def state_dict(self):
+        state = super().state_dict()
+        if self.lazy_decay:
+            # values and scale are kept apart, folding them would round the pheromone differently on resume
+            state["pheromone"] = self.pheromone.values
+            state["pheromone_scale"] = self.pheromone.scale
+        return state
+
+    def load_state_dict(self, state, restore_global_rng=False):
+        super().load_state_dict(state, restore_global_rng)
+        if self.best_path is not None:
+            self.best_path = np.asarray(self.best_path).tolist()
+        self.pheromone = self._new_pheromone(self.pheromone)
+        if self.lazy_decay and "pheromone_scale" in state:
+            self.pheromone.scale = float(np.asarray(state["pheromone_scale"]))
+        return self
+
+    def optimize(self, start_spot=0, callbacks=None, resume=False):
+        """
+
+        :param start_spot:
+        :param callbacks: list of matcha.core.callback.Callback, path search is reported as the evaluation
+            with paths as population and distances as fitness
+        :param resume: continue from the current state, such as one restored by load_state_dict
+        :return:
+        """
+        callbacks = CallbackList(callbacks)
+        callbacks.on_optimize_begin(self)
+        self.stopped = False
+        if not resume:
+            self.n_iter = 0
+        while not self.done:
+            callbacks.on_generation_begin(self)
+            callbacks.on_evaluation_begin(self)
+            paths, distances = self._search_paths(start_spot)
+            if self.local_search is not None:
+                self._improve_paths(paths, distances)
+            callbacks.on_evaluation_end(self, paths, distances)
+            deposit = self._deposit_pheromone(paths, distances)
+            self._update_best(paths, distances)
+            self.n_iter += 1
 
             # decay historical pheromone and update with current pheromone
-            self.pheromone = self.pheromone * self.decay + temp_pheromone
+            self._update_pheromone(*deposit)
+            callbacks.on_generation_end(self)
+        callbacks.on_optimize_end(self)
         return self
@@ -1,19 +1,118 @@
-import random
 import numpy as np
 from copy import deepcopy
+from functools import partial
+
+from matcha.core import Factory
+from matcha.core.callback import CallbackList
+from matcha.core.checkpoint import Checkpointable
+from matcha.core.constraint import Constrainable
+from matcha.core.fitness import calculate_fitness
+from matcha.core.rng import make_rng
+
+
+def _kdtree_type():
+    # scipy is only imported once a kdtree index is needed, it takes longer to import than numpy
+    try:
+        from scipy.spatial import cKDTree
+    except ImportError:
+        return None
+    return cKDTree
+
+
+class SwarmIndex:
+    def __init__(self, positions, visual, method="auto", max_matrix_size=2048, chunk_elements=2 ** 22):
+        """
+        visible neighbors of every fish, built once per generation
+        :param positions: (n, d) positions of the swarm
+        :param visual: fish see each other when 0 < distance < visual
+        :param method: "matrix" for pairwise distances, "kdtree" for scipy's cKDTree, "auto" to choose by swarm size
+        :param max_matrix_size: largest swarm using pairwise distances when method is "auto"
+        :param chunk_elements: bound of the (rows, n, d) difference block of the pairwise distances
+        """
+        self.positions = np.asarray(positions)
+        self.visual = visual
+        self.chunk_elements = chunk_elements
+        if method == "auto":
+            method = "kdtree" if len(self.positions) > max_matrix_size and _kdtree_type() is not None else "matrix"
+        if method == "kdtree" and _kdtree_type() is None:
+            raise ImportError("scipy is required for the kdtree swarm index.")
+        if method not in ("matrix", "kdtree"):
+            raise ValueError(f"unknown swarm index method {method}.")
+        self.method = method
+
+    def _visible(self, distance):
+        return (distance > 0) & (distance < self.visual)
+
+    def _matrix_pairs(self):
+        n, d = self.positions.shape
+        rows = max(1, self.chunk_elements // max(n * d, 1))
+        counts, indices = [], []
+        for start in range(0, n, rows):
+            block = self.positions[start: start + rows, np.newaxis, :] - self.positions[np.newaxis, ...]
+            visible = self._visible(np.sqrt(np.square(block).mean(axis=-1)))
+            counts.append(visible.sum(axis=1))
+            indices.append(np.nonzero(visible)[1])
+        return counts, indices
+
+    def _kdtree_pairs(self):
+        # the tree uses euclidean distance, fish use root mean square distance
+        tree = _kdtree_type()(self.positions)
+        radius = self.visual * np.sqrt(self.positions.shape[1])
+        counts, indices = [], []
+        for position, candidates in zip(self.positions, tree.query_ball_point(self.positions, r=radius)):
+            candidates = np.sort(np.asarray(candidates, dtype=np.intp))
+            distance = np.sqrt(np.square(self.positions[candidates] - position).mean(axis=-1))
+            candidates = candidates[self._visible(distance)]
+            counts.append([len(candidates)])
+            indices.append(candidates)
+        return counts, indices
+
+    def csr(self):
+        """
+        :return: (indptr, indices), the visible fish of fish i are indices[indptr[i]: indptr[i + 1]]
+        """
+        counts, indices = self._kdtree_pairs() if self.method == "kdtree" else self._matrix_pairs()
+        indptr = np.zeros(len(self.positions) + 1, dtype=np.intp)
+        if counts:
+            np.cumsum(np.concatenate(counts), out=indptr[1:])
+            indices = np.concatenate(indices).astype(np.intp)
+        else:
+            indices = np.zeros(0, dtype=np.intp)
+        return indptr, indices
+
+    def neighbors(self):
+        """
+        :return: list of index arrays, the visible fish of every fish
+        """
+        indptr, indices = self.csr()
+        return np.split(indices, indptr[1:-1])
 
 
 class Fish:
-    def __init__(self, scorer, init_p, init_d, visual, retry):
+    def __init__(self, scorer, init_p, init_d, visual, retry, position=None, fitness=None, index=None, rng=None):
+        """
+
+        :param scorer: maps an (n, d) matrix of positions to an (n,) fitness vector
+        :param init_p:
+        :param init_d:
+        :param visual:
+        :param retry:
+        :param position: initial position, drawn from init_p if not given
+        :param fitness: fitness of the initial position, scored if not given
+        :param index: position of the fish in its swarm, used to look up SwarmIndex neighbors
+        :param rng: numpy Generator, shared by the swarm
+        """
+        self.index = index
+        self.rng = make_rng(rng)
         self.scorer = scorer
         self.init_p = init_p
         self.init_d = init_d
         self.visual = visual
         self.retry = retry
 
-        self.position = self.init_p()
+        self.position = self.init_p() if position is None else position
         self.speed = None
-        self.fitness = self.scorer(self.position)
+        self.fitness = self.scorer(self.position[np.newaxis, ...])[0] if fitness is None else fitness
 
     def __sub__(self, other):
         """
@@ -23,7 +122,9 @@ class Fish:
         """
         return np.sqrt(np.square(self.position - other.position).mean())
 
-    def get_visible_swarm(self, swarm):
+    def get_visible_swarm(self, swarm, neighbors=None):
+        if neighbors is not None:
+            return [swarm[i] for i in neighbors[self.index]]
         visible_swarm = []
         for fish in swarm:
             if 0 < self - fish < self.visual:
@@ -35,14 +136,16 @@ class Fish:
             if np.abs(target_position - self.position).sum() == 0:
                 return self.position
             direction = target_position - self.position
+        # directions and speeds are cast to the position dtype, so float32 positions stay float32
+        direction = np.asarray(direction, dtype=self.position.dtype)
         direction /= np.linalg.norm(direction, 2)
-        position = self.position + direction * self.speed
+        position = self.position + direction * self.position.dtype.type(self.speed)
 
         return position
 
     def _prey(self, visible_swarm):
-        for _ in range(self.retry):
-            candidate = random.choice(visible_swarm)
+        for i in self.rng.integers(len(visible_swarm), size=self.retry):
+            candidate = visible_swarm[i]
             if candidate.fitness > self.fitness:
                 return self._move(candidate.position)
 
@@ -52,9 +155,9 @@ class Fish:
         visible_center = np.mean([fish.position for fish in visible_swarm], axis=0)
         return self._move(visible_center)
 
-    def _follow(self, visible_swarm, swarm):
+    def _follow(self, visible_swarm, swarm, neighbors=None):
         best_fish = max(visible_swarm, key=lambda x: x.fitness)
-        best_fish_visible_swarm = best_fish.get_visible_swarm(swarm)
+        best_fish_visible_swarm = best_fish.get_visible_swarm(swarm, neighbors)
         if not best_fish_visible_swarm:
             return
         visible_fitness = np.mean([fish.fitness for fish in best_fish_visible_swarm])
@@ -66,77 +169,370 @@ class Fish:
     def _random_move(self):
         return self._move(direction=self.init_d())
 
-    def step(self, swarm, speed):
+    def propose(self, swarm, speed, neighbors=None):
+        """
+        candidate positions of the next step, to be scored and passed to settle
+        :param swarm:
+        :param speed:
+        :param neighbors: visible fish indices of the whole swarm from SwarmIndex, scanned if not given
+        :return: list of candidate positions
+        """
         self.speed = speed
-        visible_swarm = self.get_visible_swarm(swarm)
+        candidates = []
+        visible_swarm = self.get_visible_swarm(swarm, neighbors)
         if visible_swarm:
-            self.position = max([
+            candidates = [candidate for candidate in (
                 self._prey(visible_swarm),
                 self._swarm(visible_swarm),
-                self._follow(visible_swarm, swarm)
-            ], key=lambda x: self.scorer(x) if x is not None else -np.inf)
-        else:
-            self.position = self._random_move()
-        self.fitness = self.scorer(self.position)
+                self._follow(visible_swarm, swarm, neighbors)
+            ) if candidate is not None]
+        if not candidates:
+            candidates = [self._random_move()]
+        return candidates
+
+    def settle(self, candidates, fitness):
+        best = np.argmax(fitness)
+        self.position = candidates[best]
+        self.fitness = fitness[best]
+
+    def step(self, swarm, speed, neighbors=None):
+        candidates = self.propose(swarm, speed, neighbors)
+        self.settle(candidates, self.scorer(np.array(candidates)))
+
+
+class School:
+    def __init__(self, positions, fitness, visual, retry, neighbor_index="auto", rng=None, dtype=float):
+        """
+        struct of arrays form of a swarm, every behavior is computed for the whole school at once
+        :param positions: (n, d) positions of the school
+        :param fitness: (n,) fitness of the positions
+        :param visual:
+        :param retry:
+        :param neighbor_index: SwarmIndex method
+        :param rng: numpy Generator
+        :param dtype: dtype of positions and candidates
+        """
+        self.positions = np.asarray(positions, dtype=dtype)
+        self.fitness = np.asarray(fitness, dtype=float)
+        self.visual = visual
+        self.retry = retry
+        self.neighbor_index = neighbor_index if neighbor_index is not None else "matrix"
+        self.rng = make_rng(rng)
+
+        # double buffers, the next generation is written into these and swapped in by settle
+        n, d = self.positions.shape
+        self._next_positions = np.empty_like(self.positions)
+        self._next_fitness = np.empty_like(self.fitness)
+        self._candidates = np.empty(shape=(n, 3, d), dtype=self.positions.dtype)
+
+    def _move(self, targets, speeds, out):
+        direction = targets - self.positions
+        norm = np.linalg.norm(direction, 2, axis=1)[:, np.newaxis]
+        step = np.divide(direction, norm, out=np.zeros_like(direction), where=norm > 0)
+        np.multiply(step, speeds[:, np.newaxis], out=out)
+        out += self.positions
+
+    def propose(self, speeds, direction_initialization):
+        """
+        candidate positions of prey, swarm and follow behaviors, random move when none applies
+        :param speeds: (n,) speed of every fish
+        :param direction_initialization: draws the direction of a random move
+        :return: (n, 3, d) candidates and (n, 3) mask of the valid ones
+        """
+        n = len(self.positions)
+        fish = np.arange(n)
+        candidates = self._candidates
+        valid = np.zeros(shape=(n, 3), dtype=bool)
+
+        indptr, indices = SwarmIndex(self.positions, self.visual, method=self.neighbor_index).csr()
+        counts = np.diff(indptr)
+        has_visible = counts > 0
+        if len(indices):
+            owners = np.repeat(fish, counts)
+
+            # prey: first of retry random visible fish that is better
+            offsets = self.rng.random((n, self.retry)) * counts[:, np.newaxis]
+            draws = indptr[:-1, np.newaxis] + offsets.astype(np.intp)
+            draws = indices[np.minimum(draws, len(indices) - 1)]
+            better = (self.fitness[draws] > self.fitness[:, np.newaxis]) & has_visible[:, np.newaxis]
+            valid[:, 0] = better.any(axis=1)
+            self._move(self.positions[draws[fish, better.argmax(axis=1)]], speeds, candidates[:, 0])
+
+            # swarm: center of the visible fish when they are better on average
+            visible_count = np.maximum(counts, 1)
+            mean_fitness = np.bincount(owners, weights=self.fitness[indices], minlength=n) / visible_count
+            centers = np.zeros_like(self.positions)
+            np.add.at(centers, owners, self.positions[indices])
+            centers /= visible_count[:, np.newaxis]
+            valid[:, 1] = has_visible & (mean_fitness >= self.fitness)
+            self._move(centers, speeds, candidates[:, 1])
 
+            # follow: center of the fish visible to the best visible fish
+            order = np.lexsort((-self.fitness[indices], owners))
+            best = np.zeros(n, dtype=np.intp)
+            best[has_visible] = indices[order[indptr[:-1][has_visible]]]
+            valid[:, 2] = has_visible & has_visible[best] & (mean_fitness[best] >= self.fitness)
+            self._move(centers[best], speeds, candidates[:, 2])
 
-class ArtificialFishSwarm:
-    def __init__(self, visual, retry, swarm_size, max_iter):
+        wander = ~valid.any(axis=1)
+        if wander.any():
+            directions = np.array(
+                [direction_initialization() for _ in range(wander.sum())], dtype=self.positions.dtype)
+            directions /= np.linalg.norm(directions, 2, axis=1)[:, np.newaxis]
+            candidates[wander, 0] = self.positions[wander] + directions * speeds[wander, np.newaxis]
+            valid[wander, 0] = True
+        return candidates, valid
+
+    def settle(self, candidates, valid, fitness):
+        """
+        move every fish to its best valid candidate and swap the buffers
+        :param candidates: (n, 3, d) candidates from propose
+        :param valid: (n, 3) mask from propose
+        :param fitness: fitness of candidates[valid]
+        """
+        fish = np.arange(len(valid))
+        scores = np.full(valid.shape, -np.inf)
+        scores[valid] = fitness
+        choice = scores.argmax(axis=1)
+        self._next_positions[...] = candidates[fish, choice]
+        self._next_fitness[...] = scores[fish, choice]
+        self.positions, self._next_positions = self._next_positions, self.positions
+        self.fitness, self._next_fitness = self._next_fitness, self.fitness
+
+
+@Factory.register("afs")
+class ArtificialFishSwarm(Checkpointable, Constrainable):
+    maximize = True
+    _state_attributes = ("n_iter",)
+
+    def __init__(
+            self,
+            visual,
+            retry,
+            swarm_size,
+            max_iter,
+            neighbor_index="auto",
+            vectorized=False,
+            seed=None,
+            dtype=float
+    ):
+        """
+
+        :param visual:
+        :param retry:
+        :param swarm_size:
+        :param max_iter:
+        :param neighbor_index: SwarmIndex method used for visible swarm lookups, None to scan the swarm per fish
+        :param vectorized: move the whole swarm as a School of arrays instead of one Fish at a time
+        :param seed: int, SeedSequence or numpy Generator of the random draws, shared by all fish
+        :param dtype: dtype of positions, directions and speeds, such as np.float32
+        """
         self.visual = visual
         self.swarm_size = swarm_size
         self.retry = retry
         self.max_iter = max_iter
+        self.neighbor_index = neighbor_index
+        self.vectorized = vectorized
+        self.rng = make_rng(seed)
+        self.dtype = np.dtype(dtype)
 
         self.fitness_calculation = None
         self.position_initialization = None
         self.direction_initialization = None
         self.speed_initialization = None
+        self.bounds = None
+        self.batch = False
+        self.evaluator = None
 
+        self.n_iter = 0
+        self.stopped = False
+        self.school = None
+        self.swarm = None
         self.best_fish = None
+        self._callbacks = CallbackList()
 
     def setup(
             self,
             fitness_calculation,
             position_initialization,
             direction_initialization,
-            speed_initialization
+            speed_initialization,
+            batch=False,
+            evaluator=None,
+            cache_size=None,
+            bounds=None,
+            constraints=None
     ):
-        self.fitness_calculation = fitness_calculation
+        """
+
+        :param fitness_calculation:
+        :param position_initialization:
+        :param direction_initialization:
+        :param speed_initialization:
+        :param batch:
+        :param evaluator:
+        :param cache_size:
+        :param bounds: matcha.core.constraint.Bounds every candidate position is repaired into
+        :param constraints: matcha.core.constraint.Constraints
+        :return:
+        """
         self.position_initialization = position_initialization
         self.direction_initialization = direction_initialization
         self.speed_initialization = speed_initialization
+        self._setup_evaluation(fitness_calculation, batch, evaluator, cache_size, bounds, constraints)
+
+    def _calculate_fitness(self, population):
+        self._callbacks.on_evaluation_begin(self)
+        fitness = self.evaluate(population)
+        self._callbacks.on_evaluation_end(self, population, fitness)
+        return fitness
+
+    def _scorer(self):
+        # a partial rather than a bound method, so deepcopy of a fish does not copy the optimizer
+        return partial(calculate_fitness, self.fitness_calculation, batch=self.batch)
+
+    def _find_neighbors(self, swarm):
+        if self.neighbor_index is None:
+            return None
+        positions = np.array([fish.position for fish in swarm])
+        return SwarmIndex(positions, self.visual, method=self.neighbor_index).neighbors()
+
+    def _step_swarm(self, new_swarm, swarm):
+        # every fish moves against the previous swarm, so all candidates of a generation are scored at once
+        neighbors = self._find_neighbors(swarm)
+        proposals = [fish.propose(swarm, self._speed(), neighbors) for fish in new_swarm]
+        population = self._repair(np.array([c for candidates in proposals for c in candidates]))
+        fitness = self._calculate_fitness(population)
+        offsets = np.cumsum([0] + [len(candidates) for candidates in proposals])
+        for fish, start, stop in zip(new_swarm, offsets[:-1], offsets[1:]):
+            fish.settle(population[start:stop], fitness[start:stop])
+
+    def _copy(self, fish):
+        # fish keep sharing the generator of the optimizer instead of copies replaying the same stream
+        return deepcopy(fish, {id(self.rng): self.rng})
 
-    def optimize(self):
-        swarm = self._initialize_swarm()
+    def _speed(self):
+        return self.speed_initialization() * (1 - self.n_iter / self.max_iter)
 
-        n_iter = 0
-        while n_iter < self.max_iter:
-            new_swarm = deepcopy(swarm)
+    def _snapshot(self, position, fitness):
+        # a lightweight best fish, sharing the callables instead of copying a whole swarm member
+        return Fish(
+            scorer=self._scorer(),
+            init_p=self.position_initialization,
+            init_d=self.direction_initialization,
+            visual=self.visual,
+            retry=self.retry,
+            position=position.copy(),
+            fitness=fitness,
+            rng=self.rng
+        )
+
+    @property
+    def done(self):
+        return self.stopped or self.n_iter >= self.max_iter
+
+    def optimize(self, callbacks=None, resume=False):
+        """
+
+        :param callbacks: list of matcha.core.callback.Callback
+        :param resume: continue from the current state, such as one restored by load_state_dict
+        :return:
+        """
+        self.stopped = False
+        self._callbacks = CallbackList(callbacks)
+        self._callbacks.on_optimize_begin(self)
+        if not resume:
+            self.n_iter = 0
+            positions = self._repair(
+                np.array([self.position_initialization() for _ in range(self.swarm_size)], dtype=self.dtype))
+            self._build(positions, self._calculate_fitness(positions))
+        if self.vectorized:
+            self._optimize_school()
+        else:
+            self._optimize_swarm()
+        self._callbacks.on_optimize_end(self)
+        return self
+
+    def _optimize_school(self):
+        school = self.school
+
+        while not self.done:
+            self._callbacks.on_generation_begin(self)
+            speeds = np.array([self._speed() for _ in range(self.swarm_size)], dtype=self.dtype)
+            candidates, valid = school.propose(speeds, self.direction_initialization)
+            if self.bounds is not None:
+                candidates[valid] = self._repair(candidates[valid])
+            school.settle(candidates, valid, self._calculate_fitness(candidates[valid]))
+
+            best = np.argmax(school.fitness)
+            if self.best_fish is None or self.best_fish.fitness < school.fitness[best]:
+                self.best_fish = self._snapshot(school.positions[best], school.fitness[best])
+            self.n_iter += 1
+            self._callbacks.on_generation_end(self)
+
+    def _optimize_swarm(self):
+        while not self.done:
+            self._callbacks.on_generation_begin(self)
+            new_swarm = self._copy(self.swarm)
+            self._step_swarm(new_swarm, self.swarm)
 
             for fish in new_swarm:
-                fish.step(swarm, self.speed_initialization() * (1 - n_iter / self.max_iter))
                 if self.best_fish is None or self.best_fish.fitness < fish.fitness:
-                    self.best_fish = deepcopy(fish)
-            if n_iter % 10 == 0: print(n_iter, max(fish.fitness for fish in new_swarm))
-            swarm = new_swarm
-            n_iter += 1
-        return self
+                    self.best_fish = self._copy(fish)
+            self.swarm = new_swarm
+            self.n_iter += 1
+            self._callbacks.on_generation_end(self)
 
-    def _initialize_swarm(self):
-        swarm = []
-        for _ in range(self.swarm_size):
+    def _build(self, positions, fitness):
+        """
+        the school or the swarm of fish at positions
+        :param positions: (swarm_size, d) positions
+        :param fitness: (swarm_size,) fitness of the positions
+        :return:
+        """
+        if self.vectorized:
+            self.school = School(positions, fitness, self.visual, self.retry, self.neighbor_index, self.rng, self.dtype)
+            return
+        self.swarm = []
+        for index, (position, position_fitness) in enumerate(zip(positions, fitness)):
             fish = Fish(
-                scorer=self.fitness_calculation,
+                scorer=self._scorer(),
                 init_p=self.position_initialization,
                 init_d=self.direction_initialization,
                 visual=self.visual,
-                retry=self.retry
+                retry=self.retry,
+                position=position,
+                fitness=position_fitness,
+                index=index,
+                rng=self.rng
             )
-            swarm.append(fish)
-        return swarm
+            self.swarm.append(fish)
+
+    def state_dict(self):
+        state = super().state_dict()
+        if self.school is not None:
+            state.update(positions=self.school.positions, fitness=self.school.fitness)
+        elif self.swarm is not None:
+            state.update(
+                positions=np.array([fish.position for fish in self.swarm]),
+                fitness=np.array([fish.fitness for fish in self.swarm]))
+        if self.best_fish is not None:
+            state.update(best_position=self.best_fish.position, best_fitness=self.best_fish.fitness)
+        return state
+
+    def load_state_dict(self, state, restore_global_rng=False):
+        super().load_state_dict(state, restore_global_rng)
+        self.school, self.swarm, self.best_fish = None, None, None
+        if "positions" in state:
+            self._build(np.array(state["positions"], dtype=self.dtype), np.array(state["fitness"], dtype=float))
+        if "best_position" in state:
+            self.best_fish = self._snapshot(
+                np.asarray(state["best_position"], dtype=self.dtype), float(state["best_fitness"]))
+        return self
 
 
 if __name__ == "__main__":
+    from matcha.core.callback import ProgressPrinter
 
     N_SAMPLE = 100
     N_FEATURE = 10
@@ -158,6 +554,6 @@ if __name__ == "__main__":
         direction_initialization=lambda: np.random.normal(size=11),
         speed_initialization=lambda: 1
     )
-    afs.optimize()
+    afs.optimize(callbacks=[ProgressPrinter(10)])
     print(afs.best_fish.position, afs.best_fish.fitness)
     print(w, b)
@@ -1,93 +1,607 @@
+import math
+
 import numpy as np
 
+from matcha.core import Factory
+from matcha.core.checkpoint import Checkpointable
+from matcha.core.constraint import Constrainable
+from matcha.core.driver import drive
+from matcha.core.fitness import replacement
+from matcha.core.rng import make_rng
+from matcha.core.schedule import expected_norm
+
+
+@Factory.register("es")
+class EvolutionStrategy(Checkpointable, Constrainable):
+    maximize = False
+    _state_attributes = (
+        "n_iter", "generation", "fitness", "step_size", "_search_direction", "_gradient", "_pending")
+    _state_children = ("sigma_schedule", "gradient_update")
+
+    def __init__(
+            self,
+            group_size,
+            sigma,
+            max_iter,
+            learning_rate,
+            seed=None,
+            dtype=float,
+            sigma_schedule=None,
+            gradient_update=None,
+            elitist=True
+    ):
+        """
 
-class EvolutionStrategy:
-    def __init__(self, group_size, sigma, max_iter, learning_rate):
+        :param group_size:
+        :param sigma: initial step size of the search directions
+        :param max_iter:
+        :param learning_rate:
+        :param seed: int, SeedSequence or numpy Generator of the random draws
+        :param dtype: dtype of the generation and the search directions, such as np.float32
+        :param sigma_schedule: matcha.core.schedule.StepSizeSchedule adapting the step size every iteration,
+            such as OneFifthSuccessRule or CumulativeStepSizeAdaptation, None keeps it at sigma.
+            the learning rate is scaled with the step size, so the length of the move is adapted as well
+        :param gradient_update: matcha.core.schedule.GradientUpdate such as Adam, None for plain gradient descent
+        :param elitist: keep the generation when the update does not improve its fitness
+        """
         self.group_size = group_size
         self.sigma = sigma
         self.max_iter = max_iter
         self.learning_rate = learning_rate
+        self.rng = make_rng(seed)
+        self.dtype = np.dtype(dtype)
+        self.sigma_schedule = sigma_schedule
+        self.gradient_update = gradient_update
+        self.elitist = elitist
 
         self.fitness_calculation = None
         self.initialization = None
+        self.bounds = None
+        self.batch = False
+        self.evaluator = None
 
+        self.n_iter = 0
+        self.stopped = False
         self.generation = None
         self.fitness = None
+        self.step_size = None
+        self._search_direction = None
+        self._gradient = None
+        self._pending = None
 
-    def setup(self, fitness_calculation, initialization):
-        self.fitness_calculation = fitness_calculation
-        self.initialization = initialization
+    def setup(
+            self,
+            fitness_calculation,
+            initialization,
+            batch=False,
+            evaluator=None,
+            cache_size=None,
+            bounds=None,
+            constraints=None
+    ):
+        """
 
-    def _calculate_fitness(self, generation):
-        return np.array([self.fitness_calculation(i) for i in generation])
+        :param fitness_calculation:
+        :param initialization:
+        :param batch:
+        :param evaluator:
+        :param cache_size:
+        :param bounds: matcha.core.constraint.Bounds every asked population is repaired into
+        :param constraints: matcha.core.constraint.Constraints
+        :return:
+        """
+        self.initialization = initialization
+        self._setup_evaluation(fitness_calculation, batch, evaluator, cache_size, bounds, constraints)
 
     def _sample_search_direction(self):
-        search_direction = np.random.normal(size=(self.group_size, self.generation.shape[1]))
+        search_direction = self.rng.standard_normal(size=(self.group_size, self.generation.shape[1]), dtype=self.dtype)
         return search_direction
 
-    def _estimate_gradient(self, search_direction):
-        f1 = self._calculate_fitness(self.generation + self.sigma * search_direction)
-        f2 = self._calculate_fitness(self.generation - self.sigma * search_direction)
-        gradient = np.einsum("n,nd->d", f1 - f2, search_direction) / 2 / self.sigma / self.group_size
+    def _perturb(self, search_direction):
+        # the antithetic pair is scored together so a batched objective runs once per generation
+        perturbation = float(self.step_size) * search_direction
+        return np.concatenate([self.generation + perturbation, self.generation - perturbation])
+
+    def _estimate_gradient(self, search_direction, fitness):
+        f1, f2 = np.split(self._finite_fitness(fitness), 2)
+        # fitness differences are cast down so the gradient keeps the dtype of the directions
+        gradient = np.einsum("n,nd->d", (f1 - f2).astype(self.dtype), search_direction) / 2 \
+            / float(self.step_size) / self.group_size
         return gradient[np.newaxis, ...]
 
-    def _update_generation(self, gradient):
-        new_generation = self.generation - self.learning_rate * gradient
-        new_fitness = self._calculate_fitness(new_generation)
-        if new_fitness < self.fitness:
+    def _normalized_step(self, new_generation, accepted):
+        # direction of the move with the expected length of a standard normal vector, no move when rejected
+        move = np.ravel(new_generation - self.generation).astype(float)
+        norm = np.linalg.norm(move)
+        if not accepted or norm == 0:
+            return np.zeros_like(move)
+        return move / norm * expected_norm(len(move))
+
+    def _gradient_step(self):
+        learning_rate = float(self.learning_rate) * self.step_size / float(self.sigma)
+        if self.gradient_update is None:
+            return learning_rate * self._gradient
+        return self.gradient_update.step(self._gradient, learning_rate)
+
+    def _update_generation(self, new_generation, new_fitness):
+        success = bool(new_fitness < self.fitness)
+        accepted = success or not self.elitist
+        if self.sigma_schedule is not None:
+            step = self._normalized_step(new_generation, accepted)
+            self.step_size = float(self.sigma_schedule.update(self.step_size, success, step))
+        if accepted:
             self.generation = new_generation
             self.fitness = new_fitness
 
-    def optimize(self):
-        self.generation = self.initialization()
-        self.fitness = self._calculate_fitness(self.generation)
-        n_iter = 0
-        while n_iter < self.max_iter:
-            search_direction = self._sample_search_direction()
-            gradient = self._estimate_gradient(search_direction)
-            self._update_generation(gradient)
-            n_iter += 1
-        return self
+    @property
+    def done(self):
+        return self.stopped or self.n_iter >= self.max_iter
+
+    def ask(self):
+        """
+        every iteration asks twice: the antithetic pair for the gradient, then the updated generation.
+        the initial generation is asked first.
+        :return: (n, d) positions to be scored and passed to tell
+        """
+        if self._pending is not None:
+            return self._pending
+        if self.generation is None:
+            self.generation = self._repair(np.array(self.initialization(), dtype=self.dtype))
+            self._pending = self.generation
+            self.step_size = float(self.sigma)
+            if self.sigma_schedule is not None:
+                self.sigma_schedule.reset(self.generation.shape[1])
+            if self.gradient_update is not None:
+                self.gradient_update.reset(self.generation.shape)
+        elif self._gradient is None:
+            self._search_direction = self._sample_search_direction()
+            self._pending = self._repair(self._perturb(self._search_direction))
+        else:
+            self._pending = self._repair(self.generation - self._gradient_step())
+        return self._pending
+
+    def tell(self, fitness):
+        """
+
+        :param fitness: (n,) fitness of the positions from ask
+        :return:
+        """
+        population, self._pending = self._pending, None
+        fitness = np.asarray(fitness)
+        if self.fitness is None:
+            self.fitness = fitness
+        elif self._gradient is None:
+            self._gradient = self._estimate_gradient(self._search_direction, fitness)
+        else:
+            self._update_generation(population, fitness)
+            self._gradient = None
+            self.n_iter += 1
+
+    def immigrate(self, positions, fitness):
+        """
+        a better individual from elsewhere, such as another island, replaces the generation.
+        called between tell and the next ask, a pending gradient is dropped as it belongs to the old generation.
+        :param positions: (m, d) positions
+        :param fitness: (m,) their fitness
+        :return:
+        """
+        if self.fitness is None:
+            return
+        _, incoming = replacement(self.fitness, fitness, self.maximize)
+        if len(incoming):
+            self.generation = np.array(positions[incoming], dtype=self.dtype)
+            self.fitness = np.asarray(fitness, dtype=float)[incoming]
+            self._gradient = None
+
+    def optimize(self, callbacks=None, resume=False):
+        """
+
+        :param callbacks: list of matcha.core.callback.Callback
+        :param resume: continue from the current state, such as one restored by load_state_dict
+        :return:
+        """
+        self.stopped = False
+        if not resume:
+            self.n_iter = 0
+            self.generation = None
+            self.fitness = None
+            self._gradient = None
+            self._pending = None
+        return drive(self, self.evaluate, callbacks)
 
 
-class GaussianProcessEvolutionStrategy:
-    def __init__(self, mu, la, max_iter):
+@Factory.register("gpes")
+class GaussianProcessEvolutionStrategy(Checkpointable, Constrainable):
+    maximize = False
+    _state_attributes = ("n_iter", "mean", "variance", "_immigrants", "_pending")
+
+    def __init__(self, mu, la, max_iter, seed=None, dtype=float):
+        """
+
+        :param mu: number of candidates sampled per iteration
+        :param la: number of elite candidates the distribution is fitted to
+        :param max_iter:
+        :param seed: int, SeedSequence or numpy Generator of the random draws
+        :param dtype: dtype of the distribution and the candidates, such as np.float32
+        """
         self.max_iter = max_iter
         self.mu = mu
         self.la = la
+        self.rng = make_rng(seed)
+        self.dtype = np.dtype(dtype)
 
         self.fitness_calculation = None
         self.mean_initialization = None
         self.variance_initialization = None
+        self.bounds = None
+        self.batch = False
+        self.evaluator = None
 
+        self.n_iter = 0
+        self.stopped = False
         self.mean = None
         self.variance = None
+        self._immigrants = None
+        self._pending = None
 
-    def setup(self, fitness_calculation, mean_initialization, variance_initialization):
-        self.fitness_calculation = fitness_calculation
+    def setup(
+            self,
+            fitness_calculation,
+            mean_initialization,
+            variance_initialization,
+            batch=False,
+            evaluator=None,
+            cache_size=None,
+            surrogate=None,
+            screen_fraction=.5,
+            bounds=None,
+            constraints=None
+    ):
+        """
+
+        :param fitness_calculation:
+        :param mean_initialization:
+        :param variance_initialization:
+        :param batch:
+        :param evaluator:
+        :param cache_size:
+        :param surrogate: matcha.core.surrogate regressor, such as KNNRegressor(), to pre-screen the mu
+            candidates of every iteration, the elite is selected among the really evaluated ones
+        :param screen_fraction: share of the candidates really evaluated with a surrogate, at least la of them
+        :param bounds: matcha.core.constraint.Bounds every asked population is repaired into
+        :param constraints: matcha.core.constraint.Constraints
+        :return:
+        """
+        if surrogate is not None and math.ceil(screen_fraction * self.mu) < self.la:
+            raise ValueError(f"screen_fraction {screen_fraction} evaluates less than la={self.la} candidates.")
         self.mean_initialization = mean_initialization
         self.variance_initialization = variance_initialization
+        self._setup_evaluation(
+            fitness_calculation, batch, evaluator, cache_size, bounds, constraints, surrogate, screen_fraction)
+
+    @property
+    def done(self):
+        return self.stopped or self.n_iter >= self.max_iter
+
+    def ask(self):
+        """
+        :return: (mu, d) candidates sampled from the current distribution, to be scored and passed to tell
+        """
+        if self.mean is None:
+            self.mean = np.asarray(self.mean_initialization(), dtype=self.dtype)
+            self.variance = np.asarray(self.variance_initialization(), dtype=self.dtype)
+        if self._pending is None:
+            # the covariance is diagonal, so scaled standard normals replace multivariate_normal
+            z = self.rng.standard_normal(size=(self.mu, len(self.mean)), dtype=self.dtype)
+            candidates = self.mean + np.sqrt(self.variance) * z
+            if self._immigrants is not None:
+                candidates[len(candidates) - len(self._immigrants):] = self._immigrants
+                self._immigrants = None
+            self._pending = self._repair(candidates)
+        return self._pending
+
+    def tell(self, fitness):
+        """
+
+        :param fitness: (mu,) fitness of the candidates from ask
+        :return:
+        """
+        group, self._pending = self._pending, None
+        elite = group[np.argsort(fitness)[: self.la]]
+        self.mean = elite.mean(axis=0)
+        self.variance = np.var(elite, axis=0)
+        self.n_iter += 1
+
+    def immigrate(self, positions, fitness):
+        """
+        the best individuals from elsewhere, such as another island, up to la of them, replace sampled
+        candidates of the next ask and compete for the elite with their fitness evaluated again.
+        called between tell and the next ask.
+        :param positions: (m, d) positions
+        :param fitness: (m,) their fitness
+        :return:
+        """
+        fitness = np.asarray(fitness)
+        order = np.argsort(fitness)[:self.la]
+        order = order[np.isfinite(fitness[order])]
+        self._immigrants = np.array(positions[order], dtype=self.dtype) if len(order) else None
+
+    def optimize(self, callbacks=None, resume=False):
+        """
+
+        :param callbacks: list of matcha.core.callback.Callback
+        :param resume: continue from the current state, such as one restored by load_state_dict
+        :return:
+        """
+        self.stopped = False
+        if not resume:
+            self.n_iter = 0
+            self.mean = None
+            self.variance = None
+            self._immigrants = None
+            self._pending = None
+        return drive(self, self.evaluate, callbacks)
+
+
+@Factory.register("cmaes")
+class CovarianceMatrixAdaptionEvolutionStrategy(Checkpointable, Constrainable):
+    maximize = False
+    _state_attributes = (
+        "n_iter", "mean", "step_size", "covariance", "p_c", "p_sigma", "eigen_vectors", "eigen_values",
+        "_eigen_interval", "_eigen_iter", "best_individual", "best_fitness", "_immigrants", "_n_injected", "_pending",
+        "la", "mu", "weights", "mu_eff", "c_c", "c_sigma", "c_1", "c_mu", "damps", "chi_n")
+
+    def __init__(self, sigma, max_iter, population_size=None, eigen_interval=None, seed=None):
+        """
+        CMA-ES with rank-one and rank-mu covariance updates, minimizes the fitness
+        :param sigma: initial step size
+        :param max_iter:
+        :param population_size: 4 + 3 * ln(d) by default
+        :param eigen_interval: generations between eigendecompositions of the covariance,
+            chosen from the learning rates by default
+        :param seed: int, SeedSequence or numpy Generator of the random draws
+        """
+        self.sigma = sigma
+        self.max_iter = max_iter
+        self.population_size = population_size
+        self.eigen_interval = eigen_interval
+        self.rng = make_rng(seed)
+
+        self.fitness_calculation = None
+        self.mean_initialization = None
+        self.bounds = None
+        self.batch = False
+        self.evaluator = None
+
+        self.n_iter = 0
+        self.stopped = False
+        self.mean = None
+        self.step_size = None
+        self.covariance = None
+        self.p_c = None
+        self.p_sigma = None
+        self.eigen_vectors = None
+        self.eigen_values = None
+        self.best_individual = None
+        self.best_fitness = np.inf
+        # strategy parameters, derived from the dimension when the distribution is initialized
+        self.la = None
+        self.mu = None
+        self.weights = None
+        self.mu_eff = None
+        self.c_c = None
+        self.c_sigma = None
+        self.c_1 = None
+        self.c_mu = None
+        self.damps = None
+        self.chi_n = None
+        # eigen_interval of the current problem, the one given or the one derived from the learning rates
+        self._eigen_interval = None
+        self._eigen_iter = 0
+        self._immigrants = None
+        self._n_injected = 0
+        self._pending = None
+
+    def setup(
+            self,
+            fitness_calculation,
+            mean_initialization,
+            batch=False,
+            evaluator=None,
+            cache_size=None,
+            bounds=None,
+            constraints=None
+    ):
+        """
+
+        :param fitness_calculation:
+        :param mean_initialization:
+        :param batch:
+        :param evaluator:
+        :param cache_size:
+        :param bounds: matcha.core.constraint.Bounds every asked population is repaired into,
+            the distribution is then updated from the repaired candidates
+        :param constraints: matcha.core.constraint.Constraints
+        :return:
+        """
+        self.mean_initialization = mean_initialization
+        self._setup_evaluation(fitness_calculation, batch, evaluator, cache_size, bounds, constraints)
+
+    def _initialize(self):
+        self.mean = np.asarray(self.mean_initialization(), dtype=float).reshape(-1)
+        self.step_size = float(self.sigma)
+        n = len(self.mean)
+        self.la = self.population_size or 4 + int(3 * np.log(n))
+        self.mu = self.la // 2
+        weights = np.log(self.mu + .5) - np.log(np.arange(1, self.mu + 1))
+        self.weights = weights / weights.sum()
+        self.mu_eff = 1 / np.square(self.weights).sum()
+
+        self.c_c = (4 + self.mu_eff / n) / (n + 4 + 2 * self.mu_eff / n)
+        self.c_sigma = (self.mu_eff + 2) / (n + self.mu_eff + 5)
+        self.c_1 = 2 / ((n + 1.3) ** 2 + self.mu_eff)
+        self.c_mu = min(1 - self.c_1, 2 * (self.mu_eff - 2 + 1 / self.mu_eff) / ((n + 2) ** 2 + self.mu_eff))
+        self.damps = 1 + 2 * max(0, np.sqrt((self.mu_eff - 1) / (n + 1)) - 1) + self.c_sigma
+        self.chi_n = np.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+
+        self.p_c = np.zeros(n)
+        self.p_sigma = np.zeros(n)
+        self._initialize_covariance(n)
+
+    def _initialize_covariance(self, n):
+        self.covariance = np.eye(n)
+        self.eigen_vectors = np.eye(n)
+        self.eigen_values = np.ones(n)
+        self._eigen_iter = 0
+        self._eigen_interval = self.eigen_interval
+        if self._eigen_interval is None:
+            self._eigen_interval = max(1, int(1 / (self.c_1 + self.c_mu) / n / 10))
+
+    def _decompose(self):
+        # the eigendecomposition is O(d^3), it is refreshed lazily every eigen_interval generations
+        if self.n_iter - self._eigen_iter < self._eigen_interval:
+            return
+        self.covariance = np.triu(self.covariance) + np.triu(self.covariance, 1).T
+        eigen_values, self.eigen_vectors = np.linalg.eigh(self.covariance)
+        self.eigen_values = np.sqrt(np.maximum(eigen_values, 1e-20))
+        self._eigen_iter = self.n_iter
+
+    def _sample(self, z):
+        return (z * self.eigen_values) @ self.eigen_vectors.T
+
+    def _whiten(self, y):
+        return self.eigen_vectors @ ((self.eigen_vectors.T @ y) / self.eigen_values)
+
+    def _update_covariance(self, y, h_sigma):
+        rank_one = np.outer(self.p_c, self.p_c) + (1 - h_sigma) * self.c_c * (2 - self.c_c) * self.covariance
+        rank_mu = np.einsum("n,ni,nj->ij", self.weights, y, y)
+        self.covariance = (1 - self.c_1 - self.c_mu) * self.covariance + self.c_1 * rank_one + self.c_mu * rank_mu
+
+    @property
+    def done(self):
+        return self.stopped or self.n_iter >= self.max_iter
+
+    def ask(self):
+        """
+        :return: (population_size, d) candidates sampled from the current distribution,
+            to be scored and passed to tell
+        """
+        if self.mean is None:
+            self._initialize()
+        if self._pending is None:
+            self._decompose()
+            z = self.rng.standard_normal(size=(self.la, len(self.mean)))
+            candidates = self.mean + self.step_size * self._sample(z)
+            self._n_injected = 0
+            if self._immigrants is not None:
+                self._n_injected = len(self._immigrants)
+                candidates[self.la - self._n_injected:] = self._immigrants
+                self._immigrants = None
+            self._pending = self._repair(candidates)
+        return self._pending
+
+    def tell(self, fitness):
+        """
+
+        :param fitness: (population_size,) fitness of the candidates from ask
+        :return:
+        """
+        group, self._pending = self._pending, None
+        fitness = np.asarray(fitness).reshape(-1)
+        order = np.argsort(fitness)
+        if fitness[order[0]] < self.best_fitness:
+            self.best_fitness = fitness[order[0]]
+            self.best_individual = group[order[0]].copy()
+
+        y = (group[order[: self.mu]] - self.mean) / self.step_size
+        if self._n_injected:
+            self._clip_injected(y, order[: self.mu] >= self.la - self._n_injected)
+        y_w = self.weights @ y
+        self.mean = self.mean + self.step_size * y_w
+
+        n = len(self.mean)
+        self.p_sigma = (1 - self.c_sigma) * self.p_sigma + \
+            np.sqrt(self.c_sigma * (2 - self.c_sigma) * self.mu_eff) * self._whiten(y_w)
+        norm_p_sigma = np.linalg.norm(self.p_sigma)
+        h_sigma = float(norm_p_sigma / np.sqrt(1 - (1 - self.c_sigma) ** (2 * (self.n_iter + 1))) / self.chi_n
+                        < 1.4 + 2 / (n + 1))
+        self.p_c = (1 - self.c_c) * self.p_c + h_sigma * np.sqrt(self.c_c * (2 - self.c_c) * self.mu_eff) * y_w
+
+        self._update_covariance(y, h_sigma)
+        self.step_size *= np.exp(self.c_sigma / self.damps * (norm_p_sigma / self.chi_n - 1))
+        self._n_injected = 0
+        self.n_iter += 1
+
+    def _clip_injected(self, y, injected):
+        # injected steps are not drawn from the distribution, they are shortened to the mahalanobis length
+        # a sampled step plausibly has, so one far migrant cannot blow up the mean and the covariance
+        n = y.shape[1]
+        limit = np.sqrt(n) + 2 * n / (n + 2)
+        for i in np.flatnonzero(injected):
+            norm = np.linalg.norm(self._whiten(y[i]))
+            if norm > limit:
+                y[i] *= limit / norm
+
+    def immigrate(self, positions, fitness):
+        """
+        individuals from elsewhere, such as another island, better than the best so far replace sampled
+        candidates of the next ask, at most mu of them. they are evaluated again and their steps are clipped in tell.
+        called between tell and the next ask.
+        :param positions: (m, d) positions
+        :param fitness: (m,) their fitness
+        :return:
+        """
+        if self.mean is None:
+            return
+        fitness = np.asarray(fitness)
+        order = np.argsort(fitness)[:self.mu]
+        order = order[fitness[order] < self.best_fitness]
+        self._immigrants = np.array(positions[order], dtype=float) if len(order) else None
+
+    def optimize(self, callbacks=None, resume=False):
+        """
+
+        :param callbacks: list of matcha.core.callback.Callback
+        :param resume: continue from the current state, such as one restored by load_state_dict
+        :return:
+        """
+        self.stopped = False
+        if not resume:
+            self.n_iter = 0
+            self.mean = None
+            self.best_individual = None
+            self.best_fitness = np.inf
+            self._immigrants = None
+            self._pending = None
+        return drive(self, self.evaluate, callbacks)
+
+
+@Factory.register("sepcmaes")
+class SeparableCovarianceMatrixAdaptionEvolutionStrategy(CovarianceMatrixAdaptionEvolutionStrategy):
+    """
+    sep-CMA-ES, adapts a diagonal covariance only so every generation is O(d) per candidate.
+    learning rates are raised by (d + 2) / 3 as the diagonal has d instead of d^2 / 2 parameters.
+    """
 
-    def optimize(self):
-        mean = self.mean_initialization()
-        variance = self.variance_initialization()
-        n_iter = 0
+    def _initialize_covariance(self, n):
+        self.c_1 = min(1., self.c_1 * (n + 2) / 3)
+        self.c_mu = min(1 - self.c_1, self.c_mu * (n + 2) / 3)
+        self.covariance = np.ones(n)
+        self.eigen_values = np.ones(n)
 
-        while n_iter < self.max_iter:
-            group = np.random.multivariate_normal(mean, np.diag(variance), size=self.mu)
+    def _decompose(self):
+        self.eigen_values = np.sqrt(self.covariance)
 
-            fitness = np.array([self.fitness_calculation(i) for i in group])
-            elite = group[np.argsort(fitness)[: self.la]]
-            mean = elite.mean(axis=0)
-            variance = np.var(elite, axis=0)
-            n_iter += 1
-        self.mean = mean
-        self.variance = variance
-        return self
+    def _sample(self, z):
+        return z * self.eigen_values
 
+    def _whiten(self, y):
+        return y / self.eigen_values
 
-class CovarianceMatrixAdaptionEvolutionStrategy:
-    raise NotImplementedError()
+    def _update_covariance(self, y, h_sigma):
+        rank_one = np.square(self.p_c) + (1 - h_sigma) * self.c_c * (2 - self.c_c) * self.covariance
+        rank_mu = self.weights @ np.square(y)
+        self.covariance = (1 - self.c_1 - self.c_mu) * self.covariance + self.c_1 * rank_one + self.c_mu * rank_mu
 
 
 if __name__ == "__main__":
@@ -98,17 +612,19 @@ if __name__ == "__main__":
     target = data @ weight + bias
 
     def rmse(params):
-        w = params[:10]
-        b = params[10:]
-        pred = data @ w + b
-        res = ((target.T - pred) ** 2).mean()
+        # batched objective: scores all mu candidates with one matmul
+        w = params[:, :10]
+        b = params[:, 10:]
+        pred = w @ data.T + b
+        res = ((target - pred) ** 2).mean(axis=1)
         return res
 
     es = GaussianProcessEvolutionStrategy(1000, 30, max_iter=100)
     es.setup(
         fitness_calculation=rmse,
         mean_initialization=lambda: np.random.random(11),
-        variance_initialization=lambda: np.random.random(11)
+        variance_initialization=lambda: np.random.random(11),
+        batch=True
     )
     es.optimize()
     print(es.mean)
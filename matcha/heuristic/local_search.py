@@ -0,0 +1,126 @@
+from collections import deque
+
+import numpy as np
+
+from matcha.heuristic.aco import nearest_spots
+
+
+def path_distance(graph, path):
+    path = np.asarray(path)
+    return graph[path[:-1], path[1:]].sum()
+
+
+def is_symmetric(graph, chunk_elements=2 ** 22):
+    """
+    np.allclose(graph, graph.T) comparing blocks of rows, without a transposed copy of the whole graph
+    :param graph: (n, n) distance matrix
+    :param chunk_elements: bound of the block of rows compared at once
+    :return:
+    """
+    n = graph.shape[0]
+    rows = max(1, chunk_elements // max(n, 1))
+    return all(np.allclose(graph[start:start + rows], graph[:, start:start + rows].T) for start in range(0, n, rows))
+
+
+class TourLocalSearch:
+    def __init__(self, graph, n_neighbor=10, two_opt=True, or_opt=True, max_segment=3):
+        """
+        first improvement 2-opt and Or-opt on the open paths of AntColonyOptimization, the first spot stays fixed.
+        every spot only tries moves towards its n_neighbor nearest spots, evaluated together, and is skipped
+        (don't-look bit) until one of its edges changes, so a pass is close to linear in the number of spots.
+        :param graph: (n, n) distance matrix
+        :param n_neighbor: size of the neighbor lists
+        :param two_opt: segment reversal, needs a symmetric graph
+        :param or_opt: move a segment of up to max_segment spots elsewhere in the path, without reversing it
+        :param max_segment:
+        """
+        if two_opt and not is_symmetric(graph):
+            raise ValueError("2-opt needs a symmetric distance matrix, use two_opt=False.")
+        self.graph = graph
+        self.neighbors = nearest_spots(graph, n_neighbor)
+        self.two_opt = two_opt
+        self.or_opt = or_opt
+        self.max_segment = max_segment
+
+    def _edge(self, path, i, j):
+        # distance from path[i] to path[j], path ends with a -1 sentinel so positions -1 and n have no distance
+        a, b = path[i], path[j]
+        return np.where((a >= 0) & (b >= 0), self.graph[a, b], 0.)
+
+    def _two_opt_move(self, path, position, spot):
+        """
+        best reversal of path[x + 1: y + 1] adding an edge between spot and one of its neighbors,
+        which replaces edges (x, x + 1) and (y, y + 1) by (x, y) and (x + 1, y + 1)
+        :return: (gain, x, y)
+        """
+        a, c = position[spot], position[self.neighbors[spot]]
+        x = np.concatenate([np.minimum(a, c), np.minimum(a, c) - 1])
+        y = np.concatenate([np.maximum(a, c), np.maximum(a, c) - 1])
+        valid = (x >= 0) & (y > x + 1)
+        gain = self._edge(path, x, x + 1) + self._edge(path, y, y + 1) \
+            - self._edge(path, x, y) - self._edge(path, x + 1, y + 1)
+        gain = np.where(valid, gain, 0.)
+        best = np.argmax(gain)
+        return gain[best], x[best], y[best]
+
+    def _or_opt_move(self, path, position, spot):
+        """
+        best move of a segment starting or ending at spot to right after or right before one of its neighbors
+        :return: (gain, s, e, t), path[s: e + 1] is moved between path[t] and path[t + 1]
+        """
+        n = len(path) - 1
+        lengths = np.arange(1, self.max_segment + 1)[:, np.newaxis]
+        p, c = position[spot], position[self.neighbors[spot]][np.newaxis, :]
+        # spot starts the segment and follows a neighbor, or ends it and precedes a neighbor
+        s = np.concatenate([np.broadcast_to(p, c.shape) + 0 * lengths, p - lengths + 1 + 0 * c])
+        e = s + np.concatenate([lengths, lengths]) - 1
+        t = np.concatenate([c + 0 * lengths, c - 1 + 0 * lengths])
+        s, e, t = s.ravel(), e.ravel(), t.ravel()
+        valid = (s >= 1) & (e < n) & (t >= 0) & ((t < s - 1) | (t > e))
+        e = np.minimum(e, n - 1)
+        removal = self._edge(path, s - 1, s) + self._edge(path, e, e + 1) - self._edge(path, s - 1, e + 1)
+        insertion = self._edge(path, t, s) + self._edge(path, e, t + 1) - self._edge(path, t, t + 1)
+        gain = np.where(valid, removal - insertion, 0.)
+        best = np.argmax(gain)
+        return gain[best], s[best], e[best], t[best]
+
+    def __call__(self, path):
+        """
+        :param path: spots in visiting order
+        :return: improved path as an array
+        """
+        path = np.append(np.asarray(path, dtype=np.intp), -1)
+        n = len(path) - 1
+        if n < 4:
+            return path[:-1]
+        position = np.empty(n, dtype=np.intp)
+        position[path[:-1]] = np.arange(n)
+        queue = deque(path[:-1])
+        active = np.ones(n, dtype=bool)
+
+        while queue:
+            spot = queue.popleft()
+            active[spot] = False
+            touched = None
+            if self.two_opt:
+                gain, x, y = self._two_opt_move(path, position, spot)
+                if gain > 1e-10:
+                    touched = path[[x, x + 1, y, min(y + 1, n - 1)]]
+                    path[x + 1: y + 1] = path[x + 1: y + 1][::-1].copy()
+                    position[path[x + 1: y + 1]] = np.arange(x + 1, y + 1)
+            if touched is None and self.or_opt:
+                gain, s, e, t = self._or_opt_move(path, position, spot)
+                if gain > 1e-10:
+                    touched = path[[s - 1, s, e, min(e + 1, n - 1), t, min(t + 1, n - 1)]]
+                    segment = path[s: e + 1].copy()
+                    rest = np.concatenate([path[:s], path[e + 1:]])
+                    at = t + 1 if t < s else t + 1 - len(segment)
+                    path = np.concatenate([rest[:at], segment, rest[at:]])
+                    position[path[:-1]] = np.arange(n)
+            if touched is not None:
+                # an improving move was applied, its endpoints are looked at again
+                for i in (spot, *touched):
+                    if not active[i]:
+                        active[i] = True
+                        queue.append(i)
+        return path[:-1]
@@ -1,8 +1,33 @@
 import numpy as np
 
+from matcha.core import Factory
+from matcha.core.checkpoint import Checkpointable
+from matcha.core.constraint import Constrainable
+from matcha.core.driver import drive
+from matcha.core.fitness import replacement
+from matcha.core.rng import make_rng
 
-class ParticularSwarmOptimization:
-    def __init__(self, group_size: int, w_velocity: float, w_pbest: float, w_gbest: float, max_iter: int):
+
+@Factory.register("pso")
+class ParticularSwarmOptimization(Checkpointable, Constrainable):
+    maximize = True
+    _state_attributes = (
+        "n_iter", "curr_group_position", "best_group_position", "group_velocity",
+        "curr_group_fitness", "best_group_fitness", "_pending", "_neighbors", "_last_best_fitness")
+    topologies = ("global", "ring", "von_neumann", "random")
+
+    def __init__(
+            self,
+            group_size: int,
+            w_velocity: float,
+            w_pbest: float,
+            w_gbest: float,
+            max_iter: int,
+            seed=None,
+            topology="global",
+            n_neighbor=None,
+            dtype=float
+    ):
         """
 
         :param group_size:
@@ -10,79 +35,181 @@ class ParticularSwarmOptimization:
         :param w_pbest: [0, 1] is recommended
         :param w_gbest: [0, 1] is recommended
         :param max_iter:
+        :param seed: int, SeedSequence or numpy Generator of the random draws
+        :param topology: particles follow the best of the whole swarm with "global", or the best of their
+            neighbors with "ring", "von_neumann" (4 neighbors on a torus grid) or "random" (informants drawn again
+            after every iteration without improvement of the global best)
+        :param n_neighbor: neighbors on each side for "ring", 1 by default, informants for "random", 3 by default
+        :param dtype: dtype of positions and velocities, np.float32 halves the memory of large swarms
         """
+        if topology not in self.topologies:
+            raise ValueError(f"unknown topology {topology}, use one of {self.topologies}.")
         self.group_size = group_size
         self.w_velocity = w_velocity
         self.w_pbest = w_pbest
         self.w_gbest = w_gbest
         self.max_iter = max_iter
+        self.rng = make_rng(seed)
+        self.topology = topology
+        self.n_neighbor = n_neighbor
+        self.dtype = np.dtype(dtype)
         self.n_iter = 0
+        self.stopped = False
         self.fitness_calculation = None
         self.position_initialization = None
         self.velocity_initialization = None
         self.position_validation = None
+        self.bounds = None
+        self.batch = False
+        self.evaluator = None
 
         self.curr_group_position = None
         self.best_group_position = None
         self.group_velocity = None
         self.curr_group_fitness = None
         self.best_group_fitness = None
+        self._pending = None
+        self._neighbors = None
+        self._last_best_fitness = None
+        # preallocated work arrays of the update kernels
+        self._random = None
+        self._difference = None
+        self._social = None
 
     def setup(
             self,
             fitness_calculation,
             position_initialization,
             velocity_initialization,
-            position_validation=None
+            position_validation=None,
+            batch=False,
+            evaluator=None,
+            cache_size=None,
+            surrogate=None,
+            screen_fraction=.5,
+            bounds=None,
+            constraints=None
     ):
-        self.fitness_calculation = fitness_calculation
+        """
+
+        :param fitness_calculation:
+        :param position_initialization:
+        :param velocity_initialization:
+        :param position_validation: maps the (group_size, d) positions into the search space
+        :param batch:
+        :param evaluator:
+        :param cache_size:
+        :param surrogate: matcha.core.surrogate regressor, such as KNNRegressor(), to pre-screen every
+            generation, particles screened out keep their personal best
+        :param screen_fraction: share of the particles really evaluated with a surrogate
+        :param bounds: matcha.core.constraint.Bounds the positions are repaired into after position_validation
+        :param constraints: matcha.core.constraint.Constraints
+        :return:
+        """
         self.position_initialization = position_initialization
         self.velocity_initialization = velocity_initialization
         self.position_validation = position_validation if position_validation is not None else lambda x: x
+        self._setup_evaluation(
+            fitness_calculation, batch, evaluator, cache_size, bounds, constraints, surrogate, screen_fraction)
         return self
 
     def _validate_curr_group_position(self):
-        self.curr_group_position = self.position_validation(self.curr_group_position)
+        # written back into the same array, so the position buffer is kept across iterations
+        self.curr_group_position[...] = self.position_validation(self.curr_group_position)
+        if self.bounds is not None:
+            self.bounds.repair(self.curr_group_position, self.rng, out=self.curr_group_position)
 
     def _init_group_status(self):
         self.curr_group_position = np.vstack([
-            self.position_initialization() for _ in range(self.group_size)])
+            self.position_initialization() for _ in range(self.group_size)]).astype(self.dtype)
         self._validate_curr_group_position()
 
         self.group_velocity = np.vstack([
-            self.velocity_initialization() for _ in range(self.group_size)])
+            self.velocity_initialization() for _ in range(self.group_size)]).astype(self.dtype)
         v_quantile = np.quantile(np.abs(self.group_velocity), .9)
-        self.group_velocity = np.clip(self.group_velocity, -v_quantile, v_quantile)
+        np.clip(self.group_velocity, -v_quantile, v_quantile, out=self.group_velocity)
 
-        self.best_group_position = self.curr_group_position
+        self.best_group_position = self.curr_group_position.copy()
         self.best_group_fitness = -np.ones(shape=(self.group_size, 1)) * np.inf
+        self._pending = None
+        self._neighbors = self._build_neighbors()
+        self._last_best_fitness = None
 
-    def _update_curr_group_velocity(self):
-        pbest_random = np.random.random(size=self.group_velocity.shape)
-        gbest_random = np.random.random(size=self.group_velocity.shape)
+    def _build_neighbors(self):
+        """
+        :return: (group_size, m) indices of the particles every particle learns from, itself included,
+            None for the global topology
+        """
+        n = self.group_size
+        particles = np.arange(n)[:, np.newaxis]
+        if self.topology == "ring":
+            radius = self.n_neighbor or 1
+            return (particles + np.arange(-radius, radius + 1)) % n
+        if self.topology == "von_neumann":
+            # the most square grid of rows * columns = group_size, wrapped as a torus
+            rows = max(i for i in range(1, int(np.sqrt(n)) + 1) if n % i == 0)
+            columns = n // rows
+            row, column = particles // columns, particles % columns
+            offsets = np.array([[0, 0], [-1, 0], [1, 0], [0, -1], [0, 1]])
+            return (row + offsets[:, 0]) % rows * columns + (column + offsets[:, 1]) % columns
+        if self.topology == "random":
+            informants = self.rng.integers(n, size=(n, self.n_neighbor or 3))
+            return np.concatenate([particles, informants], axis=1)
+        return None
+
+    def _allocate(self):
+        if self._difference is None or self._difference.shape != self.group_velocity.shape:
+            self._random = np.empty((2,) + self.group_velocity.shape, dtype=self.dtype)
+            self._difference = np.empty_like(self.group_velocity)
+            self._social = np.empty_like(self.group_velocity)
+
+    def _social_best(self):
+        """
+        :return: best position of the neighborhood of every particle, (1, d) for the global topology
+        """
+        if self._neighbors is None:
+            return self.best_position
+        neighbor_fitness = self.best_group_fitness[self._neighbors, 0]
+        best = self._neighbors[np.arange(self.group_size), np.argmax(neighbor_fitness, axis=1)]
+        return np.take(self.best_group_position, best, axis=0, out=self._social)
 
-        v = self.w_velocity * (self.max_iter - self.n_iter) / self.max_iter * self.group_velocity
-        p = self.w_pbest * pbest_random * (self.best_group_position - self.curr_group_position)
-        g = self.w_gbest * gbest_random * (self.best_position - self.curr_group_position)
+    def _update_curr_group_velocity(self):
+        # v = w * v + w_pbest * r1 * (pbest - x) + w_gbest * r2 * (social best - x), without temporaries
+        self._allocate()
+        pbest_random, gbest_random = self.rng.random(dtype=self.dtype, out=self._random)
+        pbest_random *= float(self.w_pbest)
+        gbest_random *= float(self.w_gbest)
+        velocity, difference = self.group_velocity, self._difference
 
-        self.group_velocity = v + p + g
+        # weights are applied as python floats, which do not upcast float32 arrays
+        velocity *= float(self.w_velocity * (self.max_iter - self.n_iter) / self.max_iter)
+        np.subtract(self.best_group_position, self.curr_group_position, out=difference)
+        difference *= pbest_random
+        velocity += difference
+        np.subtract(self._social_best(), self.curr_group_position, out=difference)
+        difference *= gbest_random
+        velocity += difference
 
     def _update_curr_group_position(self):
-        self.curr_group_position = self.curr_group_position + self.group_velocity
+        self.curr_group_position += self.group_velocity
         self._validate_curr_group_position()
 
     def _update_best_group_position(self):
-        self.best_group_position = np.where(
-            self.curr_group_fitness > self.best_group_fitness,
-            self.curr_group_position, self.best_group_position)
-
-    def _update_curr_group_fitness(self):
-        self.curr_group_fitness = np.array([self.fitness_calculation(i) for i in self.curr_group_position])[..., np.newaxis]
+        np.copyto(self.best_group_position, self.curr_group_position,
+                  where=self.curr_group_fitness > self.best_group_fitness)
 
     def _update_best_group_fitness(self):
-        self.best_group_fitness = np.where(
-            self.curr_group_fitness > self.best_group_fitness,
-            self.curr_group_fitness, self.best_group_fitness)
+        np.copyto(self.best_group_fitness, self.curr_group_fitness,
+                  where=self.curr_group_fitness > self.best_group_fitness)
+
+    def _update_neighbors(self):
+        # random informants are drawn again when the global best did not improve
+        if self.topology != "random":
+            return
+        best_fitness = self.best_fitness
+        if self._last_best_fitness is not None and not best_fitness > self._last_best_fitness:
+            self._neighbors = self._build_neighbors()
+        self._last_best_fitness = best_fitness
 
     @property
     def best_position(self):
@@ -92,24 +219,78 @@ class ParticularSwarmOptimization:
     def best_fitness(self):
         return self.best_group_fitness.max()
 
-    def optimize(self):
-
-        self._init_group_status()
+    @property
+    def done(self):
+        return self.stopped or self.n_iter >= self.max_iter
 
-        while self.n_iter < self.max_iter:
+    def ask(self):
+        """
+        positions of the next generation, to be scored and passed to tell.
+        the array is updated in place by the next ask, copy it to keep it.
+        :return: (group_size, d) positions
+        """
+        if self.curr_group_position is None:
+            self._init_group_status()
+        if self._pending is None:
             self._update_curr_group_position()
-            self._update_curr_group_fitness()
-            self._update_best_group_position()
-            self._update_best_group_fitness()
-            self._update_curr_group_velocity()
-            if self.n_iter % 100 == 0:
-                print(self.n_iter, self.w_velocity * (self.max_iter - self.n_iter) / self.max_iter, self.best_fitness)
-            self.n_iter += 1
+            self._pending = self.curr_group_position
+        return self._pending
+
+    def tell(self, fitness):
+        """
+
+        :param fitness: (group_size,) fitness of the positions from ask
+        :return:
+        """
+        self._pending = None
+        self.curr_group_fitness = np.asarray(fitness, dtype=float).reshape(-1, 1)
+        self._update_best_group_position()
+        self._update_best_group_fitness()
+        self._update_neighbors()
+        self._update_curr_group_velocity()
+        self.n_iter += 1
 
+    def immigrate(self, positions, fitness):
+        """
+        better individuals from elsewhere, such as another island, replace the worst personal bests.
+        called between tell and the next ask.
+        :param positions: (m, d) positions
+        :param fitness: (m,) their fitness
+        :return:
+        """
+        slots, incoming = replacement(self.best_group_fitness, fitness, self.maximize)
+        self.best_group_position[slots] = positions[incoming]
+        self.best_group_fitness[slots, 0] = np.asarray(fitness)[incoming]
+
+    def load_state_dict(self, state, restore_global_rng=False):
+        super().load_state_dict(state, restore_global_rng)
+        # restored arrays may be read only memory maps, the kernels update them in place
+        for name in ("curr_group_position", "best_group_position", "group_velocity"):
+            if getattr(self, name) is not None:
+                setattr(self, name, np.array(getattr(self, name), dtype=self.dtype))
+        if self.best_group_fitness is not None:
+            self.best_group_fitness = np.array(self.best_group_fitness, dtype=float)
+        if self._pending is not None:
+            self._pending = self.curr_group_position
         return self
 
+    def optimize(self, callbacks=None, resume=False):
+        """
+
+        :param callbacks: list of matcha.core.callback.Callback
+        :param resume: continue from the current state, such as one restored by load_state_dict
+        :return:
+        """
+        self.stopped = False
+        if not resume:
+            self.n_iter = 0
+            self._init_group_status()
+        return drive(self, self.evaluate, callbacks)
+
 
 if __name__ == "__main__":
+    from matcha.core.callback import ProgressPrinter
+
     N_SAMPLE = 100
     N_FEATURE = 10
     data = np.random.normal(size=(N_SAMPLE, N_FEATURE))
@@ -118,17 +299,19 @@ if __name__ == "__main__":
     target = data @ w + b
 
     def rmse(weights):
-        w = weights[:N_FEATURE]
-        b = weights[N_FEATURE:]
-        predict = data @ w + b
-        return -np.mean((target - predict) ** 2)
+        # batched objective: scores the whole (group_size, 11) swarm with one matmul
+        w = weights[:, :N_FEATURE]
+        b = weights[:, N_FEATURE:]
+        predict = w @ data.T + b
+        return -np.mean((target - predict) ** 2, axis=1)
 
     pso = ParticularSwarmOptimization(100, 1, 1, 1, 100)
     pso.setup(
         fitness_calculation=rmse,
         position_initialization=lambda: np.random.random((1, 11)),
-        velocity_initialization=lambda: np.random.random((1, 11))
+        velocity_initialization=lambda: np.random.random((1, 11)),
+        batch=True
     )
-    pso.optimize()
+    pso.optimize(callbacks=[ProgressPrinter(100)])
     print(pso.best_position, pso.best_fitness)
     print(w, b)
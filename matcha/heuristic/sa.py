@@ -1,51 +1,305 @@
 import numpy as np
 
+from matcha.core import Factory
+from matcha.core.checkpoint import Checkpointable
+from matcha.core.constraint import Constrainable
+from matcha.core.driver import drive
+from matcha.core.fitness import replacement
+from matcha.core.rng import make_rng
 
-class SimulatedAnnealing:
-    def __init__(self, temperature, max_iter):
-        self.temperature = temperature
+
+@Factory.register("sa")
+class SimulatedAnnealing(Checkpointable, Constrainable):
+    maximize = True
+    _state_attributes = (
+        "n_iter", "temperature", "step_size", "individual", "individual_fitness", "best_individual", "best_fitness",
+        "_pending")
+    _state_children = ("cooling",)
+
+    def __init__(
+            self,
+            temperature,
+            max_iter,
+            seed=None,
+            cooling=None,
+            step_size=1.,
+            target_acceptance=None,
+            adaptation_rate=.1
+    ):
+        """
+
+        :param temperature: initial temperature
+        :param max_iter:
+        :param seed: int, SeedSequence or numpy Generator of the random draws
+        :param cooling: matcha.core.schedule.CoolingSchedule such as ExponentialCooling, LogarithmicCooling or
+            AdaptiveCooling, None keeps the temperature constant
+        :param step_size: initial standard deviation of the disturbance
+        :param target_acceptance: acceptance rate the step size is tuned to, None keeps it constant
+        :param adaptation_rate: log change of the step size per iteration away from target_acceptance
+        """
+        self.initial_temperature = temperature
+        self.initial_step_size = step_size
         self.max_iter = max_iter
+        self.rng = make_rng(seed)
+        self.cooling = cooling
+        self.target_acceptance = target_acceptance
+        self.adaptation_rate = adaptation_rate
 
         self.initialization = None
         self.fitness_calculation = None
+        self.bounds = None
+        self.batch = False
+        self.evaluator = None
 
+        self.n_iter = 0
+        self.stopped = False
+        self.temperature = temperature
+        self.step_size = step_size
         self.individual = None
+        self.individual_fitness = None
         self.best_individual = None
         self.best_fitness = -np.inf
+        self._pending = None
+
+    def setup(
+            self,
+            fitness_calculation,
+            initialization,
+            batch=False,
+            evaluator=None,
+            cache_size=None,
+            bounds=None,
+            constraints=None
+    ):
+        """
 
-    def setup(self, fitness_calculation, initialization):
-        self.fitness_calculation = fitness_calculation
+        :param fitness_calculation:
+        :param initialization:
+        :param batch:
+        :param evaluator:
+        :param cache_size:
+        :param bounds: matcha.core.constraint.Bounds every candidate is repaired into
+        :param constraints: matcha.core.constraint.Constraints
+        :return:
+        """
         self.initialization = initialization
+        self._setup_evaluation(fitness_calculation, batch, evaluator, cache_size, bounds, constraints)
 
-    def _add_disturbance(self):
-        return self.individual + np.random.normal(size=self.individual.shape)
+    def _step_sizes(self):
+        return self.step_size
 
-    def optimize(self):
-        self.individual = self.initialization()
+    def _add_disturbance(self):
+        return self._repair(self.individual + self._step_sizes() * self.rng.standard_normal(size=self.individual.shape))
 
-        individual_fitness = self.fitness_calculation(self.individual)
-        n_iter = 0
-        while n_iter < self.max_iter:
-            candidate = self._add_disturbance()
-            candidate_fitness = self.fitness_calculation(candidate)
-            delta_fitness = candidate_fitness - individual_fitness
+    def _accept(self, candidate, candidate_fitness):
+        delta_fitness = candidate_fitness - self.individual_fitness
 
+        with np.errstate(over="ignore"):
             probability = 1 / (1 + np.exp(delta_fitness / self.temperature))
-            update_flag = np.random.choice([0, 1], p=[probability, 1 - probability])
+        update_flag = self.rng.random() >= probability
+
+        if delta_fitness < 0 and not update_flag:
+            return False
+        self.individual_fitness = candidate_fitness
+        self.individual = candidate
+
+        if self.individual_fitness > self.best_fitness:
+            self.best_individual = self.individual
+            self.best_fitness = self.individual_fitness
+        return True
+
+    def _reset_schedules(self):
+        self.temperature = self.initial_temperature
+        self.step_size = self.initial_step_size
+        if self.cooling is not None:
+            self.cooling.reset(self.temperature)
+
+    def _adapt(self, accepted):
+        # accepted is a flag, or the (n_chain,) flags of every chain
+        if self.cooling is not None:
+            self.temperature = self.cooling.update(
+                np.asarray(self.temperature, dtype=float), self.n_iter, accepted,
+                self._finite_fitness(self.individual_fitness))
+        if self.target_acceptance is not None:
+            self.step_size = self.step_size * np.exp(
+                self.adaptation_rate * (np.asarray(accepted, dtype=float) - self.target_acceptance))
+
+    @property
+    def done(self):
+        return self.stopped or self.n_iter >= self.max_iter
+
+    def ask(self):
+        """
+        the initial individual is asked first, then one disturbed candidate per iteration
+        :return: (1, d) position to be scored and passed to tell
+        """
+        if self._pending is None:
+            if self.individual is None:
+                self._reset_schedules()
+                self.individual = self._repair(np.array(self.initialization()))
+                self._pending = self.individual
+            else:
+                self._pending = self._add_disturbance()
+        return self._pending[np.newaxis, ...]
+
+    def tell(self, fitness):
+        """
+
+        :param fitness: (1,) fitness of the position from ask
+        :return:
+        """
+        candidate, self._pending = self._pending, None
+        fitness = np.asarray(fitness).reshape(-1)[0]
+        if self.individual_fitness is None:
+            self.individual_fitness = fitness
+            return
+        accepted = self._accept(candidate, fitness)
+        self.n_iter += 1
+        self._adapt(accepted)
+
+    def immigrate(self, positions, fitness):
+        """
+        a better individual from elsewhere, such as another island, replaces the current state.
+        called between tell and the next ask.
+        :param positions: (m, d) positions
+        :param fitness: (m,) their fitness
+        :return:
+        """
+        if self.individual_fitness is None:
+            return
+        _, incoming = replacement(self.individual_fitness, fitness, self.maximize)
+        if len(incoming):
+            self.individual, self.individual_fitness = np.array(positions[incoming[0]]), fitness[incoming[0]]
+            if self.individual_fitness > self.best_fitness:
+                self.best_individual, self.best_fitness = self.individual, self.individual_fitness
+
+    def optimize(self, callbacks=None, resume=False):
+        """
+
+        :param callbacks: list of matcha.core.callback.Callback
+        :param resume: continue from the current state, such as one restored by load_state_dict
+        :return:
+        """
+        self.stopped = False
+        if not resume:
+            self.n_iter = 0
+            self.individual = None
+            self.individual_fitness = None
+            self._pending = None
+        return drive(self, self.evaluate, callbacks)
+
+
+@Factory.register("mcsa")
+class MultiChainSimulatedAnnealing(SimulatedAnnealing):
+    _state_attributes = SimulatedAnnealing._state_attributes + ("n_swap",)
+
+    def __init__(self, temperature, max_iter, n_chain, swap_interval=None, seed=None, **kwargs):
+        """
+        n_chain independent chains advanced together as an (n_chain, d) array, scored in one evaluation
+        :param temperature: shared temperature, or (n_chain,) temperature of every chain
+        :param max_iter:
+        :param n_chain:
+        :param swap_interval: parallel tempering, swap states of neighbouring temperatures every swap_interval
+            iterations, None for independent chains
+        :param seed: int, SeedSequence or numpy Generator of the random draws
+        :param kwargs: cooling, step_size, target_acceptance and adaptation_rate of SimulatedAnnealing,
+            cooled temperatures and tuned step sizes are kept per chain
+        """
+        super().__init__(temperature, max_iter, seed, **kwargs)
+        self.n_chain = n_chain
+        self.swap_interval = swap_interval
+        self.n_swap = 0
+
+    def _temperatures(self):
+        return np.broadcast_to(np.asarray(self.temperature, dtype=float), (self.n_chain,))
+
+    def _step_sizes(self):
+        return np.broadcast_to(np.asarray(self.step_size, dtype=float), (self.n_chain,))[:, np.newaxis]
+
+    def _accept(self, candidate, candidate_fitness):
+        delta_fitness = candidate_fitness - self.individual_fitness
+
+        with np.errstate(over="ignore"):
+            probability = 1 / (1 + np.exp(delta_fitness / self._temperatures()))
+        update_flag = self.rng.random(self.n_chain) >= probability
+        accepted = (delta_fitness >= 0) | update_flag
+
+        self.individual = np.where(accepted[:, np.newaxis], candidate, self.individual)
+        self.individual_fitness = np.where(accepted, candidate_fitness, self.individual_fitness)
+
+        accepted_fitness = np.where(accepted, candidate_fitness, -np.inf)
+        best = np.argmax(accepted_fitness)
+        if accepted_fitness[best] > self.best_fitness:
+            self.best_individual = self.individual[best].copy()
+            self.best_fitness = accepted_fitness[best]
+        return accepted
+
+    def _swap_chains(self):
+        # neighbouring temperatures, alternating between even and odd pairs
+        order = np.argsort(self._temperatures())
+        offset = (self.n_iter // self.swap_interval) % 2
+        i, j = order[offset:-1:2], order[offset + 1::2]
+        beta = 1 / self._temperatures()
+        log_probability = (self.individual_fitness[j] - self.individual_fitness[i]) * (beta[i] - beta[j])
+        swapped = np.log(self.rng.random(len(i))) < log_probability
+        i, j = i[swapped], j[swapped]
+        self.individual[np.concatenate([i, j])] = self.individual[np.concatenate([j, i])]
+        self.individual_fitness[np.concatenate([i, j])] = self.individual_fitness[np.concatenate([j, i])]
+        self.n_swap += len(i)
+
+    def ask(self):
+        """
+        the initial chains are asked first, then one disturbed candidate per chain and iteration
+        :return: (n_chain, d) positions to be scored and passed to tell
+        """
+        if self._pending is None:
+            if self.individual is None:
+                self._reset_schedules()
+                self.individual = self._repair(np.array([self.initialization() for _ in range(self.n_chain)]))
+                self._pending = self.individual
+            else:
+                self._pending = self._add_disturbance()
+        return self._pending
 
-            if delta_fitness < 0 and update_flag == 0:
-                n_iter += 1
-                continue
-            individual_fitness = candidate_fitness
-            self.individual = candidate
+    def tell(self, fitness):
+        """
 
-            if individual_fitness > self.best_fitness:
-                self.best_individual = self.individual
-                self.best_fitness = individual_fitness
+        :param fitness: (n_chain,) fitness of the positions from ask
+        :return:
+        """
+        candidate, self._pending = self._pending, None
+        fitness = np.asarray(fitness, dtype=float).reshape(-1)
+        if self.individual_fitness is None:
+            self.individual_fitness = fitness
+            return
+        accepted = self._accept(candidate, fitness)
+        self.n_iter += 1
+        self._adapt(accepted)
+        if self.swap_interval and self.n_iter % self.swap_interval == 0:
+            self._swap_chains()
 
-            n_iter += 1
+    def immigrate(self, positions, fitness):
+        """
+        better individuals from elsewhere, such as another island, replace the states of the worst chains.
+        called between tell and the next ask.
+        :param positions: (m, d) positions
+        :param fitness: (m,) their fitness
+        :return:
+        """
+        if self.individual_fitness is None:
+            return
+        fitness = np.asarray(fitness, dtype=float)
+        chains, incoming = replacement(self.individual_fitness, fitness, self.maximize)
+        self.individual[chains] = positions[incoming]
+        self.individual_fitness[chains] = fitness[incoming]
+        if len(incoming) and fitness[incoming].max() > self.best_fitness:
+            best = incoming[np.argmax(fitness[incoming])]
+            self.best_individual, self.best_fitness = np.array(positions[best]), fitness[best]
 
-        return self
+    def optimize(self, callbacks=None, resume=False):
+        if not resume:
+            self.n_swap = 0
+        return super().optimize(callbacks, resume)
 
 
 if __name__ == "__main__":
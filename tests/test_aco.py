@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from matcha.heuristic.aco import nearest_spots
+from matcha.heuristic.local_search import TourLocalSearch, is_symmetric
+
+
+def test_nearest_spots_chunks():
+    graph = np.random.RandomState(0).randint(1, 20, (30, 30))
+    expected = nearest_spots(graph, 5)
+    assert np.array_equal(nearest_spots(graph, 5, chunk_elements=1), expected)
+    assert np.array_equal(nearest_spots(graph, 5, chunk_elements=100), expected)
+    assert not np.any(expected == np.arange(30)[:, np.newaxis])
+    distance = np.take_along_axis(graph, expected, axis=1)
+    assert np.all(np.diff(distance, axis=1) >= 0)
+
+
+def test_is_symmetric():
+    graph = np.random.RandomState(0).rand(30, 30)
+    graph += graph.T
+    for chunk_elements in (1, 100, 2 ** 22):
+        assert is_symmetric(graph, chunk_elements)
+    graph[25, 3] += 1
+    for chunk_elements in (1, 100, 2 ** 22):
+        assert not is_symmetric(graph, chunk_elements)
+    with pytest.raises(ValueError):
+        TourLocalSearch(graph)
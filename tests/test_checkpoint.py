@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+
+from matcha.core.checkpoint import Checkpoint, load_state
+from matcha.core.schedule import ExponentialCooling
+from matcha.core.stopping import StoppingCriterion
+from matcha.heuristic.aco import AntColonyOptimization
+from matcha.heuristic.afs import ArtificialFishSwarm
+from matcha.heuristic.es import (CovarianceMatrixAdaptionEvolutionStrategy, EvolutionStrategy,
+                                 GaussianProcessEvolutionStrategy)
+from matcha.heuristic.pso import ParticularSwarmOptimization
+from matcha.heuristic.sa import MultiChainSimulatedAnnealing, SimulatedAnnealing
+
+
+def sphere(x):
+    return np.sum(x ** 2, axis=1)
+
+
+def negative_sphere(x):
+    return -sphere(x)
+
+
+def pso(max_iter):
+    optimizer = ParticularSwarmOptimization(10, .7, 1.5, 1.5, max_iter, topology="random", seed=5)
+    return optimizer.setup(negative_sphere, lambda: np.random.rand(1, 3), lambda: np.random.rand(1, 3), batch=True)
+
+
+def es(max_iter):
+    optimizer = EvolutionStrategy(10, .1, max_iter, .01, seed=5)
+    optimizer.setup(sphere, lambda: np.ones((1, 3)), batch=True)
+    return optimizer
+
+
+def gpes(max_iter):
+    optimizer = GaussianProcessEvolutionStrategy(20, 5, max_iter, seed=5)
+    optimizer.setup(sphere, lambda: np.random.rand(3), lambda: np.ones(3), batch=True)
+    return optimizer
+
+
+def cma(max_iter):
+    optimizer = CovarianceMatrixAdaptionEvolutionStrategy(1, max_iter, eigen_interval=3, seed=5)
+    optimizer.setup(sphere, lambda: np.ones(5), batch=True)
+    return optimizer
+
+
+def sa(max_iter):
+    optimizer = SimulatedAnnealing(1, max_iter, seed=5, cooling=ExponentialCooling())
+    optimizer.setup(negative_sphere, lambda: np.ones(3), batch=True)
+    return optimizer
+
+
+def mcsa(max_iter):
+    optimizer = MultiChainSimulatedAnnealing(np.linspace(.1, 2, 6), max_iter, 6, swap_interval=3, seed=5)
+    optimizer.setup(negative_sphere, lambda: np.ones(3), batch=True)
+    return optimizer
+
+
+def afs(max_iter, vectorized=False):
+    optimizer = ArtificialFishSwarm(.5, 3, 20, max_iter, vectorized=vectorized, seed=5)
+    optimizer.setup(negative_sphere, lambda: np.random.rand(3), lambda: np.random.normal(size=3), lambda: .1,
+                    batch=True)
+    return optimizer
+
+
+def aco(max_iter, **kwargs):
+    graph = np.random.RandomState(0).rand(40, 40)
+    return AntColonyOptimization(graph, 5, max_iter, seed=5, **kwargs)
+
+
+OPTIMIZERS = {
+    "pso": pso,
+    "es": es,
+    "gpes": gpes,
+    "cma": cma,
+    "sa": sa,
+    "mcsa": mcsa,
+    "afs": afs,
+    "afs_vectorized": lambda max_iter: afs(max_iter, vectorized=True),
+    "aco": aco,
+    "aco_lazy_decay": lambda max_iter: aco(max_iter, vectorized=True, n_candidate=5, lazy_decay=True),
+}
+
+
+# work buffers rewritten before they are read, not part of the state
+BUFFERS = {"_random", "_difference", "_social", "_next_positions", "_next_fitness", "_candidates"}
+
+
+class StopAt(StoppingCriterion):
+    def __init__(self, n_iter):
+        super().__init__()
+        self.n_iter = n_iter
+
+    def on_generation_end(self, optimizer):
+        if optimizer.n_iter >= self.n_iter:
+            self._stop(optimizer)
+
+
+def assert_state_equal(state, other):
+    assert state.keys() == other.keys()
+    for key, value in state.items():
+        if isinstance(value, dict):
+            assert_state_equal(value, other[key])
+        else:
+            assert np.array_equal(np.asarray(value), np.asarray(other[key])), key
+
+
+# an attribute lost on resume may only change the run at some stop points
+@pytest.mark.parametrize("stop", (13, 15))
+@pytest.mark.parametrize("name", OPTIMIZERS)
+def test_resume(name, stop, tmp_path):
+    make = OPTIMIZERS[name]
+    path = str(tmp_path / "checkpoint.npz")
+    np.random.seed(1)
+    uninterrupted = make(40)
+    uninterrupted.optimize()
+
+    np.random.seed(1)
+    make(40).optimize(callbacks=[Checkpoint(path, 7), StopAt(stop)])
+    np.random.seed(99)
+    resumed = make(40)
+    # arrays above the threshold are memory mapped from the npz
+    resumed.load_state_dict(load_state(path, mmap_threshold=64), restore_global_rng=True)
+    assert resumed.n_iter == stop
+    resumed.optimize(resume=True)
+    assert_state_equal(resumed.state_dict(), uninterrupted.state_dict())
+    # attributes left out of _state_attributes are compared too
+    attributes = {key: value for key, value in vars(uninterrupted).items()
+                  if isinstance(value, (np.ndarray, np.number, int, float)) and key not in BUFFERS}
+    assert_state_equal({key: getattr(resumed, key) for key in attributes}, attributes)
@@ -0,0 +1,81 @@
+import warnings
+
+import numpy as np
+
+from matcha.core.constraint import Bounds, ConstrainedEvaluator, Constraints
+from matcha.core.surrogate import KNNRegressor, RBFRegressor
+from matcha.heuristic.es import (CovarianceMatrixAdaptionEvolutionStrategy, EvolutionStrategy,
+                                 GaussianProcessEvolutionStrategy)
+from matcha.heuristic.pso import ParticularSwarmOptimization
+
+
+def shifted_sphere(x):
+    return ((np.asarray(x) - 3) ** 2).sum(-1)
+
+
+def constraints():
+    # x0 <= 1, the constrained optimum is 4 at (1, 3)
+    return Constraints(lambda x: x[:, :1] - 1)
+
+
+def test_reflect_equal_bounds():
+    repaired = Bounds([0., 0.], [0., 1.], "reflect").repair(np.array([[.3, 1.25], [-5., -.25]]))
+    assert np.array_equal(repaired, [[0., .75], [0., .25]])
+
+
+def test_infeasible_ranks_behind_feasible():
+    evaluator = ConstrainedEvaluator(constraints=constraints())
+    infeasible = evaluator.evaluate(shifted_sphere, np.array([[1.5, 3.], [2., 0.]]), batch=True)
+    feasible = evaluator.evaluate(shifted_sphere, np.array([[-100., -100.]]), batch=True)
+    assert infeasible[0] < infeasible[1]
+    assert np.all(feasible[0] < infeasible)
+    assert evaluator.n_skipped == 0
+
+
+def test_start_infeasible():
+    cma = CovarianceMatrixAdaptionEvolutionStrategy(1., 200, seed=0)
+    cma.setup(shifted_sphere, lambda: np.array([2., 0.]), batch=True, constraints=constraints())
+    cma.optimize()
+    assert cma.best_individual[0] <= 1
+    assert np.isclose(cma.best_fitness, 4, atol=1e-3)
+
+    es = EvolutionStrategy(10, .3, 300, .05, seed=0)
+    es.setup(shifted_sphere, lambda: np.array([[2., 0.]]), batch=True, constraints=constraints())
+    es.optimize()
+    assert es.generation[0, 0] <= 1
+    assert es.fitness[0] < 5
+
+
+def test_float32():
+    for constrained in (None, constraints()):
+        es = EvolutionStrategy(10, .3, 200, .05, seed=0, dtype=np.float32)
+        es.setup(shifted_sphere, lambda: np.array([[2., 0.]]), batch=True, constraints=constrained)
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            es.optimize()
+        assert es.generation.dtype == np.float32
+        assert constrained is None or es.generation[0, 0] <= 1
+    evaluator = ConstrainedEvaluator(constraints=constraints())
+    fitness = evaluator.evaluate(
+        lambda x: shifted_sphere(x).astype(np.float32), np.array([[1.5, 3.], [2., 0.], [0., 3.]], np.float32), True)
+    assert np.all(np.isfinite(fitness)) and fitness[2] < fitness[0] < fitness[1]
+
+
+def test_surrogate_with_constraints():
+    for surrogate in (RBFRegressor(), KNNRegressor()):
+        es = GaussianProcessEvolutionStrategy(40, 10, 60, seed=0)
+        es.setup(shifted_sphere, lambda: np.full(4, 2.), lambda: np.full(4, 4.), batch=True, surrogate=surrogate,
+                 constraints=constraints(), bounds=Bounds(-5, 5))
+        random = np.random.RandomState(0)
+        pso = ParticularSwarmOptimization(30, .7, 1.5, 1.5, 100, seed=0)
+        pso.setup(lambda x: -shifted_sphere(x), lambda: random.uniform(-5, 5, (1, 4)),
+                  lambda: random.uniform(-1, 1, (1, 4)), batch=True, surrogate=surrogate.__class__(),
+                  constraints=constraints(), bounds=Bounds(-5, 5))
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            es.optimize()
+            pso.optimize()
+        assert np.all(np.abs(es.evaluator.archive.fitness) < 1e3)
+        assert np.all(np.abs(pso.evaluator.archive.fitness) < 1e3)
+        assert es.mean[0] <= 1 and pso.best_position[0, 0] <= 1
+        assert np.isclose(pso.best_fitness, -4, atol=1e-2)
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+from matcha.core.constraint import Bounds, Constraints
+from matcha.core.driver import optimize_async
+from matcha.heuristic.es import GaussianProcessEvolutionStrategy
+
+
+def shifted_sphere(x):
+    return ((np.asarray(x) - 3) ** 2).sum(-1)
+
+
+def test_async_evaluator_chain():
+    sizes = []
+
+    def fitness_calculation(population):
+        sizes.append(len(population))
+        return shifted_sphere(population)
+
+    es = GaussianProcessEvolutionStrategy(20, 5, 30, seed=0)
+    es.setup(fitness_calculation, lambda: np.full(4, 2.), lambda: np.full(4, 4.), batch=True, cache_size=100,
+             constraints=Constraints(lambda x: x[:, :1] - 1), bounds=Bounds(-5, 5))
+    optimize_async([es])
+    assert max(sizes) == 20 and es.mean[0] <= 1
+    with pytest.raises(ValueError):
+        optimize_async([es], shifted_sphere)
@@ -0,0 +1,25 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from matcha.core.callback import count_evaluations
+from matcha.core.constraint import ConstrainedEvaluator, Constraints
+from matcha.core.evaluator import CachedEvaluator
+
+
+def test_cache_hits_are_not_counted():
+    positions = []
+
+    def fitness_calculation(population):
+        positions.extend(population)
+        return np.asarray(population).sum(-1)
+
+    for evaluator in (CachedEvaluator(cache=10),
+                      ConstrainedEvaluator(CachedEvaluator(cache=10), Constraints(lambda x: x[:, :1] - 1))):
+        positions.clear()
+        optimizer = SimpleNamespace(evaluator=evaluator)
+        n_evaluation = 0
+        for population in ([[0., 0.], [0., 0.], [2., 1.]], [[0., 0.], [1., 1.], [5., 5.]]):
+            fitness = evaluator.evaluate(fitness_calculation, np.array(population), True)
+            n_evaluation += count_evaluations(optimizer, fitness)
+        assert n_evaluation == len(positions)